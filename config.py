@@ -7,11 +7,64 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 ADMIN_ID = int(os.getenv('ADMIN_ID'))
 GROUP_ID = int(os.getenv('GROUP_ID'))
 SMS_GROUP_ID = int(os.getenv('SMS_GROUP_ID'))
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'g4f')
+LLM_API_BASE = os.getenv('LLM_API_BASE', 'https://api.openai.com/v1')
+LLM_API_KEY = os.getenv('LLM_API_KEY')
+LLM_MODEL = os.getenv('LLM_MODEL')
+LLM_HTTP_POOL_SIZE = 20
+LLM_MAX_CONCURRENT = 8
+LLM_MAX_QUEUE_WAIT = 20
+LLM_STREAMING = True
+AI_REQUEST_DEADLINE = 60
+AI_ATTEMPT_TIMEOUT = 45
+AI_MIN_ATTEMPT_TIME = 5
+AI_RETRY_BASE_DELAY = 1
+AI_RETRY_MAX_DELAY = 8
+AI_BREAKER_WINDOW = 20
+AI_BREAKER_MIN_CALLS = 10
+AI_BREAKER_FAILURE_RATE = 0.5
+AI_BREAKER_COOLDOWN = 30
+STREAM_EDIT_INTERVAL = 1.2
+STREAM_MIN_CHARS = 20
+LLM_PROVIDER_ATTEMPTS = 3
+LLM_PROVIDER_TIMEOUT = 20
+LLM_HEDGING = False
+LLM_HEDGE_PERCENTILE = 0.9
+LLM_HEDGE_DEFAULT_DELAY = 8
+LLM_HEDGE_MIN_DELAY = 1
+LLM_HEDGE_BUDGET = 0.2
+PROVIDER_LATENCY_WINDOW = 50
+PROVIDER_STATS_DECAY = 0.95
+PROVIDER_EXPLORE_RATE = 0.1
+PROVIDER_QUARANTINE_AFTER = 3
+PROVIDER_QUARANTINE_BASE = 60
+PROVIDER_QUARANTINE_MAX = 30 * 60
 DB_PATH = 'bot.db'
+DB_POOL_SIZE = 4
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 16384
+DB_MMAP_SIZE = 256 * 1024 * 1024
+WRITE_BEHIND_DELAY_MS = 50
+WRITE_BEHIND_MAX_ROWS = 100
+WRITE_BEHIND_MAX_RETRIES = 5
+USER_CACHE_SIZE = 5000
+EXPORT_GZIP = False
 
 PHOTOS_MIN = 2
 PHOTOS_MAX = 3
 AI_CONFIDENCE_THRESHOLD = 70
+MESSAGE_COALESCE_WINDOW = 1.5
+PROMPT_TOKEN_BUDGET = 6000
+PROMPT_CHARS_PER_TOKEN = 3
+PROMPT_MIN_TRUNCATED_CHARS = 200
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL = 6 * 60 * 60
+ANSWER_CACHE_MIN_CONFIDENCE = 85
+ANSWER_CACHE_MIN_WORDS = 3
+ANSWER_INDEX_BUCKETS = 2 ** 18
+ANSWER_INDEX_THRESHOLD = 0.8
+ANSWER_INDEX_MIN_MARGIN = 0.05
+ANSWER_INDEX_TOP_K = 3
 
 ANALYSIS_TEXT_DIR = 'analtext'
 ANALYSIS_AUDIO_DIR = 'analaudio'
@@ -1,4 +1,6 @@
 from .core import init_db
+from .pool import init_pool, close_pool, get_db
+from .write_behind import flush_writes
 from .users import (
     get_user, create_user, update_user_status, update_user_language,
     get_all_users_list, get_users_count, get_stats, 
@@ -12,8 +14,11 @@ from .messages import (
 from .photos import save_photo, get_photos
 from .applications import create_application, update_application_status
 from .faq import get_faq, init_default_faq
-from .ai_learning import save_ai_learning, get_ai_learning
-from .settings import get_setting, set_setting, init_default_settings
+from .ai_learning import save_ai_learning, get_ai_learning, get_admin_ai_learning, get_top_ai_learning
+from .versions import data_version, bump_data_version
+from .settings import (
+    get_setting, set_setting, get_cached_setting, load_settings, init_default_settings
+)
 from .forbidden import (
     get_forbidden_topics_from_db, add_forbidden_topic,
     delete_forbidden_topic, init_forbidden_topics
@@ -21,6 +26,10 @@ from .forbidden import (
 
 __all__ = [
     'init_db',
+    'init_pool',
+    'close_pool',
+    'get_db',
+    'flush_writes',
     'get_user',
     'create_user',
     'update_user_status',
@@ -49,8 +58,14 @@ __all__ = [
     'init_default_faq',
     'save_ai_learning',
     'get_ai_learning',
+    'get_admin_ai_learning',
+    'get_top_ai_learning',
+    'data_version',
+    'bump_data_version',
     'get_setting',
     'set_setting',
+    'get_cached_setting',
+    'load_settings',
     'init_default_settings',
     'get_forbidden_topics_from_db',
     'add_forbidden_topic',
@@ -1,16 +1,79 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
+from .write_behind import enqueue_write, flush_writes
+from .versions import data_version, bump_data_version
+
+TOP_LEARNING_LIMIT = 10
+
+# Строки с наибольшей уверенностью для промпта
+_top_learning = None
 
 async def save_ai_learning(question, answer, source, confidence):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            'INSERT INTO ai_learning (question, answer, source, confidence) VALUES (?, ?, ?, ?)',
-            (question, answer, source, confidence)
-        )
-        await db.commit()
+    global _top_learning
+    enqueue_write(
+        'INSERT INTO ai_learning (question, answer, source, confidence) VALUES (?, ?, ?, ?)',
+        (question, answer, source, confidence)
+    )
+    if source == 'admin':
+        bump_data_version('ai_learning_admin')
+
+    if _top_learning is None:
+        bump_data_version('ai_learning')
+        return
+
+    # Строка, не попавшая в топ, его не меняет
+    confidence = confidence or 0
+    if len(_top_learning) >= TOP_LEARNING_LIMIT and confidence <= _top_learning[-1]['confidence']:
+        return
+
+    position = len(_top_learning)
+    for i, row in enumerate(_top_learning):
+        if confidence > row['confidence']:
+            position = i
+            break
+
+    top = list(_top_learning)
+    top.insert(position, {
+        'question': question,
+        'answer': answer,
+        'source': source,
+        'confidence': confidence
+    })
+    _top_learning = top[:TOP_LEARNING_LIMIT]
+    bump_data_version('ai_learning')
 
 async def get_ai_learning():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    await flush_writes()
+    async with get_db() as db:
         async with db.execute('SELECT * FROM ai_learning ORDER BY confidence DESC') as cursor:
-            return await cursor.fetchall()
\ No newline at end of file
+            return await cursor.fetchall()
+
+async def get_admin_ai_learning(after_id=0):
+    await flush_writes()
+    async with get_db() as db:
+        async with db.execute(
+            "SELECT id, question, answer FROM ai_learning WHERE source = 'admin' AND id > ? ORDER BY id",
+            (after_id,)
+        ) as cursor:
+            return await cursor.fetchall()
+
+async def get_top_ai_learning():
+    global _top_learning
+    if _top_learning is not None:
+        return _top_learning
+
+    await flush_writes()
+    version = data_version('ai_learning')
+    async with get_db() as db:
+        async with db.execute(
+            'SELECT question, answer, source, confidence FROM ai_learning ORDER BY confidence DESC LIMIT ?',
+            (TOP_LEARNING_LIMIT,)
+        ) as cursor:
+            top = [dict(row) for row in await cursor.fetchall()]
+
+    for row in top:
+        row['confidence'] = row['confidence'] or 0
+
+    # Сохранение во время загрузки могло в неё не попасть
+    if version == data_version('ai_learning'):
+        _top_learning = top
+    return top
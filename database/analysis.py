@@ -1,8 +1,7 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
 
 async def save_analysis_text(message_id, text, filename, text_ru=None, text_uk=None, text_en=None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('''
             INSERT INTO analysis_text (message_id, text, filename, text_ru, text_uk, text_en)
             VALUES (?, ?, ?, ?, ?, ?)
@@ -10,7 +9,7 @@ async def save_analysis_text(message_id, text, filename, text_ru=None, text_uk=N
         await db.commit()
 
 async def save_analysis_audio(message_id, transcription, filename, transcription_ru=None, transcription_uk=None, transcription_en=None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('''
             INSERT INTO analysis_audio (message_id, transcription, filename, transcription_ru, transcription_uk, transcription_en)
             VALUES (?, ?, ?, ?, ?, ?)
@@ -18,7 +17,7 @@ async def save_analysis_audio(message_id, transcription, filename, transcription
         await db.commit()
 
 async def save_analysis_video(message_id, transcription, filename, transcription_ru=None, transcription_uk=None, transcription_en=None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('''
             INSERT INTO analysis_video (message_id, transcription, filename, transcription_ru, transcription_uk, transcription_en)
             VALUES (?, ?, ?, ?, ?, ?)
@@ -26,7 +25,7 @@ async def save_analysis_video(message_id, transcription, filename, transcription
         await db.commit()
 
 async def save_analysis_sms(message_id, text, filename):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('''
             INSERT INTO analysis_sms (message_id, text, filename)
             VALUES (?, ?, ?)
@@ -34,8 +33,7 @@ async def save_analysis_sms(message_id, text, filename):
         await db.commit()
 
 async def get_all_analysis_texts(lang=None):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM analysis_text ORDER BY timestamp DESC') as cursor:
             rows = await cursor.fetchall()
             result = [dict(row) for row in rows]
@@ -47,8 +45,7 @@ async def get_all_analysis_texts(lang=None):
             return result
 
 async def get_all_analysis_audios(lang=None):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM analysis_audio ORDER BY timestamp DESC') as cursor:
             rows = await cursor.fetchall()
             result = [dict(row) for row in rows]
@@ -60,8 +57,7 @@ async def get_all_analysis_audios(lang=None):
             return result
 
 async def get_all_analysis_videos(lang=None):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM analysis_video ORDER BY timestamp DESC') as cursor:
             rows = await cursor.fetchall()
             result = [dict(row) for row in rows]
@@ -73,14 +69,13 @@ async def get_all_analysis_videos(lang=None):
             return result
 
 async def get_all_analysis_sms():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM analysis_sms ORDER BY timestamp DESC') as cursor:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
 async def clear_analysis_data():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('DELETE FROM analysis_text')
         await db.execute('DELETE FROM analysis_audio')
         await db.execute('DELETE FROM analysis_video')
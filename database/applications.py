@@ -1,8 +1,7 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
 
 async def create_application(user_id, work_hours, experience):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'INSERT INTO applications (user_id, work_hours, previous_experience) VALUES (?, ?, ?)',
             (user_id, work_hours, experience)
@@ -10,7 +9,7 @@ async def create_application(user_id, work_hours, experience):
         await db.commit()
 
 async def update_application_status(user_id, status):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'UPDATE applications SET status = ? WHERE user_id = ? AND status = "pending"',
             (status, user_id)
@@ -1,237 +1,10 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
+from .migrations import run_migrations
 import logging
 
 logger = logging.getLogger(__name__)
 
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                status TEXT DEFAULT 'new',
-                photos_count INTEGER DEFAULT 0,
-                in_groups INTEGER DEFAULT 0,
-                language TEXT DEFAULT 'ru',
-                hidden_at TIMESTAMP DEFAULT NULL,
-                last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor = await db.execute("PRAGMA table_info(users)")
-        columns = await cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        if 'last_activity' not in column_names:
-            await db.execute('ALTER TABLE users ADD COLUMN last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
-            logger.info("Added last_activity column")
-        
-        if 'in_groups' not in column_names:
-            await db.execute('ALTER TABLE users ADD COLUMN in_groups INTEGER DEFAULT 0')
-            logger.info("Added in_groups column")
-        
-        if 'language' not in column_names:
-            await db.execute('ALTER TABLE users ADD COLUMN language TEXT DEFAULT "ru"')
-            logger.info("Added language column")
-
-        if 'hidden_at' not in column_names:
-            await db.execute('ALTER TABLE users ADD COLUMN hidden_at TIMESTAMP DEFAULT NULL')
-            logger.info("Added hidden_at column")
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                role TEXT,
-                content TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS photos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                file_id TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS applications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER UNIQUE,
-                work_hours TEXT,
-                previous_experience TEXT,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS faq (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT,
-                answer TEXT,
-                category TEXT DEFAULT 'general',
-                language TEXT DEFAULT 'ru',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS ai_learning (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT,
-                answer TEXT,
-                source TEXT,
-                confidence INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS forbidden_topics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT,
-                keywords TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS pending_questions (
-                user_id INTEGER PRIMARY KEY,
-                question TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS group_messages (
-                message_id INTEGER PRIMARY KEY,
-                message_type TEXT,
-                content TEXT,
-                file_id TEXT,
-                username TEXT,
-                processed INTEGER DEFAULT 0,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS analysis_text (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id INTEGER,
-                text TEXT,
-                text_ru TEXT,
-                text_uk TEXT,
-                text_en TEXT,
-                filename TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor = await db.execute("PRAGMA table_info(analysis_text)")
-        columns = await cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        if 'text_ru' not in column_names:
-            await db.execute('ALTER TABLE analysis_text ADD COLUMN text_ru TEXT')
-            logger.info("Added text_ru column to analysis_text")
-        if 'text_uk' not in column_names:
-            await db.execute('ALTER TABLE analysis_text ADD COLUMN text_uk TEXT')
-            logger.info("Added text_uk column to analysis_text")
-        if 'text_en' not in column_names:
-            await db.execute('ALTER TABLE analysis_text ADD COLUMN text_en TEXT')
-            logger.info("Added text_en column to analysis_text")
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS analysis_audio (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id INTEGER,
-                transcription TEXT,
-                transcription_ru TEXT,
-                transcription_uk TEXT,
-                transcription_en TEXT,
-                filename TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor = await db.execute("PRAGMA table_info(analysis_audio)")
-        columns = await cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        if 'transcription_ru' not in column_names:
-            await db.execute('ALTER TABLE analysis_audio ADD COLUMN transcription_ru TEXT')
-            logger.info("Added transcription_ru column to analysis_audio")
-        if 'transcription_uk' not in column_names:
-            await db.execute('ALTER TABLE analysis_audio ADD COLUMN transcription_uk TEXT')
-            logger.info("Added transcription_uk column to analysis_audio")
-        if 'transcription_en' not in column_names:
-            await db.execute('ALTER TABLE analysis_audio ADD COLUMN transcription_en TEXT')
-            logger.info("Added transcription_en column to analysis_audio")
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS analysis_video (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id INTEGER,
-                transcription TEXT,
-                transcription_ru TEXT,
-                transcription_uk TEXT,
-                transcription_en TEXT,
-                filename TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor = await db.execute("PRAGMA table_info(analysis_video)")
-        columns = await cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        if 'transcription_ru' not in column_names:
-            await db.execute('ALTER TABLE analysis_video ADD COLUMN transcription_ru TEXT')
-            logger.info("Added transcription_ru column to analysis_video")
-        if 'transcription_uk' not in column_names:
-            await db.execute('ALTER TABLE analysis_video ADD COLUMN transcription_uk TEXT')
-            logger.info("Added transcription_uk column to analysis_video")
-        if 'transcription_en' not in column_names:
-            await db.execute('ALTER TABLE analysis_video ADD COLUMN transcription_en TEXT')
-            logger.info("Added transcription_en column to analysis_video")
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS analysis_sms (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id INTEGER,
-                text TEXT,
-                filename TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS user_groups (
-                user_id INTEGER PRIMARY KEY,
-                in_groups INTEGER DEFAULT 0,
-                last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await db.commit()
-        logger.info("Database initialized successfully")
\ No newline at end of file
+    async with get_db() as db:
+        await run_migrations(db)
+        logger.info("Database initialized successfully")
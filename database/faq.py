@@ -1,14 +1,11 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
+from .versions import bump_data_version
+from .queries import FAQ_BY_CATEGORY
 
 async def get_faq(category=None):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         if category:
-            async with db.execute(
-                'SELECT * FROM faq WHERE category = ?',
-                (category,)
-            ) as cursor:
+            async with db.execute(FAQ_BY_CATEGORY, (category,)) as cursor:
                 return await cursor.fetchall()
         else:
             async with db.execute('SELECT * FROM faq') as cursor:
@@ -198,10 +195,11 @@ async def init_default_faq():
         ("проблемы с приложением", "Опиши подробнее проблему, я помогу разобраться. Можешь прислать скриншот 📱", "working"),
     ]
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         for q, a, c in faq_data:
             await db.execute(
                 'INSERT OR IGNORE INTO faq (question, answer, category) VALUES (?, ?, ?)',
                 (q, a, c)
             )
-        await db.commit()
\ No newline at end of file
+        await db.commit()
+    bump_data_version('faq')
\ No newline at end of file
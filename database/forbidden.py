@@ -1,31 +1,34 @@
-import aiosqlite
 import json
-from config import DB_PATH, FORBIDDEN_TOPICS
+from config import FORBIDDEN_TOPICS
+from .pool import get_db
+from .versions import bump_data_version
 
 async def get_forbidden_topics_from_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM forbidden_topics') as cursor:
             return await cursor.fetchall()
 
 async def add_forbidden_topic(topic, keywords):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'INSERT INTO forbidden_topics (topic, keywords) VALUES (?, ?)',
             (topic, keywords)
         )
         await db.commit()
+    bump_data_version('forbidden')
 
 async def delete_forbidden_topic(topic_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('DELETE FROM forbidden_topics WHERE id = ?', (topic_id,))
         await db.commit()
+    bump_data_version('forbidden')
 
 async def init_forbidden_topics():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         for topic_name, keywords in FORBIDDEN_TOPICS.items():
             await db.execute(
                 'INSERT OR IGNORE INTO forbidden_topics (topic, keywords) VALUES (?, ?)',
                 (topic_name, json.dumps(keywords))
             )
-        await db.commit()
\ No newline at end of file
+        await db.commit()
+    bump_data_version('forbidden')
\ No newline at end of file
@@ -1,35 +1,28 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
+from .write_behind import enqueue_write, flush_writes
+from .queries import RECENT_MESSAGES, USER_CONVERSATION
 
 async def save_message(user_id, role, content):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            'INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)',
-            (user_id, role, content)
-        )
-        await db.commit()
+    enqueue_write(
+        'INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)',
+        (user_id, role, content)
+    )
 
 async def get_messages(user_id, limit=10):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            'SELECT * FROM messages WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?',
-            (user_id, limit)
-        ) as cursor:
+    await flush_writes()
+    async with get_db() as db:
+        async with db.execute(RECENT_MESSAGES, (user_id, limit)) as cursor:
             rows = await cursor.fetchall()
             return list(reversed(rows))
 
 async def get_user_conversations(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            'SELECT * FROM messages WHERE user_id = ? ORDER BY timestamp',
-            (user_id,)
-        ) as cursor:
+    await flush_writes()
+    async with get_db() as db:
+        async with db.execute(USER_CONVERSATION, (user_id,)) as cursor:
             return await cursor.fetchall()
 
 async def save_pending_question(user_id, question):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'INSERT OR REPLACE INTO pending_questions (user_id, question) VALUES (?, ?)',
             (user_id, question)
@@ -37,12 +30,12 @@ async def save_pending_question(user_id, question):
         await db.commit()
 
 async def get_pending_question(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         async with db.execute('SELECT question FROM pending_questions WHERE user_id = ?', (user_id,)) as cursor:
             row = await cursor.fetchone()
             return row[0] if row else None
 
 async def delete_pending_question(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('DELETE FROM pending_questions WHERE user_id = ?', (user_id,))
         await db.commit()
\ No newline at end of file
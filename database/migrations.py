@@ -0,0 +1,413 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+BASE_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        status TEXT DEFAULT 'new',
+        photos_count INTEGER DEFAULT 0,
+        in_groups INTEGER DEFAULT 0,
+        language TEXT DEFAULT 'ru',
+        hidden_at TIMESTAMP DEFAULT NULL,
+        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        role TEXT,
+        content TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS photos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        file_id TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS applications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER UNIQUE,
+        work_hours TEXT,
+        previous_experience TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS faq (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT,
+        answer TEXT,
+        category TEXT DEFAULT 'general',
+        language TEXT DEFAULT 'ru',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS ai_learning (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT,
+        answer TEXT,
+        source TEXT,
+        confidence INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS forbidden_topics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic TEXT,
+        keywords TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS pending_questions (
+        user_id INTEGER PRIMARY KEY,
+        question TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS group_messages (
+        message_id INTEGER PRIMARY KEY,
+        message_type TEXT,
+        content TEXT,
+        file_id TEXT,
+        username TEXT,
+        processed INTEGER DEFAULT 0,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analysis_text (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id INTEGER,
+        text TEXT,
+        text_ru TEXT,
+        text_uk TEXT,
+        text_en TEXT,
+        filename TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analysis_audio (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id INTEGER,
+        transcription TEXT,
+        transcription_ru TEXT,
+        transcription_uk TEXT,
+        transcription_en TEXT,
+        filename TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analysis_video (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id INTEGER,
+        transcription TEXT,
+        transcription_ru TEXT,
+        transcription_uk TEXT,
+        transcription_en TEXT,
+        filename TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analysis_sms (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id INTEGER,
+        text TEXT,
+        filename TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_groups (
+        user_id INTEGER PRIMARY KEY,
+        in_groups INTEGER DEFAULT 0,
+        last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+LEGACY_COLUMNS = {
+    'users': [
+        ('last_activity', 'TIMESTAMP'),
+        ('in_groups', 'INTEGER DEFAULT 0'),
+        ('language', "TEXT DEFAULT 'ru'"),
+        ('hidden_at', 'TIMESTAMP DEFAULT NULL'),
+    ],
+    'analysis_text': [
+        ('text_ru', 'TEXT'),
+        ('text_uk', 'TEXT'),
+        ('text_en', 'TEXT'),
+    ],
+    'analysis_audio': [
+        ('transcription_ru', 'TEXT'),
+        ('transcription_uk', 'TEXT'),
+        ('transcription_en', 'TEXT'),
+    ],
+    'analysis_video': [
+        ('transcription_ru', 'TEXT'),
+        ('transcription_uk', 'TEXT'),
+        ('transcription_en', 'TEXT'),
+    ],
+}
+
+INDEXES = [
+    ('idx_messages_user_id', 'messages(user_id, id)'),
+    ('idx_messages_user_role', 'messages(user_id, role)'),
+    ('idx_photos_user_id', 'photos(user_id, id)'),
+    ('idx_faq_category', 'faq(category)'),
+    ('idx_users_hidden_activity', 'users(hidden_at, last_activity)'),
+    ('idx_users_last_activity', 'users(last_activity)'),
+    ('idx_users_status', 'users(status)'),
+    ('idx_group_messages_processed', 'group_messages(processed, timestamp)'),
+    ('idx_ai_learning_source', 'ai_learning(source, confidence)'),
+]
+
+async def _migrate_base_schema(db):
+    for statement in BASE_TABLES:
+        await db.execute(statement)
+
+    # В старых БД может не быть колонок, добавленных позже
+    for table, columns in LEGACY_COLUMNS.items():
+        async with db.execute(f'PRAGMA table_info({table})') as cursor:
+            existing = {col[1] for col in await cursor.fetchall()}
+        for name, definition in columns:
+            if name not in existing:
+                await db.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+                logger.info(f"Added {name} column to {table}")
+
+    # ADD COLUMN не принимает DEFAULT CURRENT_TIMESTAMP, заполняем отдельно
+    await db.execute('UPDATE users SET last_activity = CURRENT_TIMESTAMP WHERE last_activity IS NULL')
+
+async def _migrate_indexes(db):
+    for name, target in INDEXES:
+        await db.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+STATS_COUNTERS = [
+    '''
+    CREATE TABLE IF NOT EXISTS user_status_counts (
+        status TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_daily_counts (
+        day TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS ai_learning_counts (
+        source TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0,
+        confidence_sum INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS ai_learning_daily_counts (
+        day TEXT,
+        source TEXT,
+        count INTEGER NOT NULL DEFAULT 0,
+        confidence_sum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, source)
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_users_count_insert AFTER INSERT ON users
+    BEGIN
+        INSERT INTO user_status_counts (status, count) VALUES (IFNULL(NEW.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        INSERT INTO user_daily_counts (day, count) VALUES (date('now'), 1)
+            ON CONFLICT(day) DO UPDATE SET count = count + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_users_count_delete AFTER DELETE ON users
+    BEGIN
+        UPDATE user_status_counts SET count = count - 1 WHERE status = IFNULL(OLD.status, '');
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_users_count_status AFTER UPDATE OF status ON users
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        UPDATE user_status_counts SET count = count - 1 WHERE status = IFNULL(OLD.status, '');
+        INSERT INTO user_status_counts (status, count) VALUES (IFNULL(NEW.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_ai_learning_count_insert AFTER INSERT ON ai_learning
+    BEGIN
+        INSERT INTO ai_learning_counts (source, count, confidence_sum)
+            VALUES (IFNULL(NEW.source, ''), 1, IFNULL(NEW.confidence, 0))
+            ON CONFLICT(source) DO UPDATE SET
+                count = count + 1,
+                confidence_sum = confidence_sum + IFNULL(NEW.confidence, 0);
+        INSERT INTO ai_learning_daily_counts (day, source, count, confidence_sum)
+            VALUES (date('now'), IFNULL(NEW.source, ''), 1, IFNULL(NEW.confidence, 0))
+            ON CONFLICT(day, source) DO UPDATE SET
+                count = count + 1,
+                confidence_sum = confidence_sum + IFNULL(NEW.confidence, 0);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_ai_learning_count_delete AFTER DELETE ON ai_learning
+    BEGIN
+        UPDATE ai_learning_counts SET
+            count = count - 1,
+            confidence_sum = confidence_sum - IFNULL(OLD.confidence, 0)
+        WHERE source = IFNULL(OLD.source, '');
+    END
+    ''',
+]
+
+async def _migrate_stats_counters(db):
+    for statement in STATS_COUNTERS:
+        await db.execute(statement)
+
+    # Начальные значения счётчиков из существующих данных
+    await db.execute('DELETE FROM user_status_counts')
+    await db.execute('DELETE FROM user_daily_counts')
+    await db.execute('DELETE FROM ai_learning_counts')
+    await db.execute('DELETE FROM ai_learning_daily_counts')
+    await db.execute('''
+        INSERT INTO user_status_counts (status, count)
+        SELECT IFNULL(status, ''), COUNT(*) FROM users GROUP BY IFNULL(status, '')
+    ''')
+    await db.execute('''
+        INSERT INTO user_daily_counts (day, count)
+        SELECT date(created_at), COUNT(*) FROM users
+        WHERE created_at IS NOT NULL GROUP BY date(created_at)
+    ''')
+    await db.execute('''
+        INSERT INTO ai_learning_counts (source, count, confidence_sum)
+        SELECT IFNULL(source, ''), COUNT(*), IFNULL(SUM(confidence), 0)
+        FROM ai_learning GROUP BY IFNULL(source, '')
+    ''')
+    await db.execute('''
+        INSERT INTO ai_learning_daily_counts (day, source, count, confidence_sum)
+        SELECT date(created_at), IFNULL(source, ''), COUNT(*), IFNULL(SUM(confidence), 0)
+        FROM ai_learning WHERE created_at IS NOT NULL
+        GROUP BY date(created_at), IFNULL(source, '')
+    ''')
+
+# В старых БД last_activity добавлен через ALTER TABLE без DEFAULT
+LAST_ACTIVITY_DEFAULT = '''
+    CREATE TRIGGER IF NOT EXISTS trg_users_last_activity AFTER INSERT ON users
+    WHEN NEW.last_activity IS NULL
+    BEGIN
+        UPDATE users SET last_activity = CURRENT_TIMESTAMP WHERE user_id = NEW.user_id;
+    END
+'''
+
+async def _migrate_last_activity_default(db):
+    await db.execute(LAST_ACTIVITY_DEFAULT)
+    await db.execute('UPDATE users SET last_activity = CURRENT_TIMESTAMP WHERE last_activity IS NULL')
+
+# AVG(confidence) не учитывает NULL, поэтому считаем их отдельно
+AI_LEARNING_CONFIDENCE_COUNT = [
+    'DROP TRIGGER IF EXISTS trg_ai_learning_count_insert',
+    'DROP TRIGGER IF EXISTS trg_ai_learning_count_delete',
+    'ALTER TABLE ai_learning_counts ADD COLUMN confidence_count INTEGER NOT NULL DEFAULT 0',
+    '''
+    CREATE TRIGGER trg_ai_learning_count_insert AFTER INSERT ON ai_learning
+    BEGIN
+        INSERT INTO ai_learning_counts (source, count, confidence_sum, confidence_count)
+            VALUES (IFNULL(NEW.source, ''), 1, IFNULL(NEW.confidence, 0), NEW.confidence IS NOT NULL)
+            ON CONFLICT(source) DO UPDATE SET
+                count = count + 1,
+                confidence_sum = confidence_sum + IFNULL(NEW.confidence, 0),
+                confidence_count = confidence_count + (NEW.confidence IS NOT NULL);
+        INSERT INTO ai_learning_daily_counts (day, source, count, confidence_sum)
+            VALUES (date('now'), IFNULL(NEW.source, ''), 1, IFNULL(NEW.confidence, 0))
+            ON CONFLICT(day, source) DO UPDATE SET
+                count = count + 1,
+                confidence_sum = confidence_sum + IFNULL(NEW.confidence, 0);
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_ai_learning_count_delete AFTER DELETE ON ai_learning
+    BEGIN
+        UPDATE ai_learning_counts SET
+            count = count - 1,
+            confidence_sum = confidence_sum - IFNULL(OLD.confidence, 0),
+            confidence_count = confidence_count - (OLD.confidence IS NOT NULL)
+        WHERE source = IFNULL(OLD.source, '');
+    END
+    ''',
+    '''
+    UPDATE ai_learning_counts SET confidence_count = (
+        SELECT COUNT(confidence) FROM ai_learning
+        WHERE IFNULL(ai_learning.source, '') = ai_learning_counts.source
+    )
+    ''',
+]
+
+async def _migrate_confidence_count(db):
+    for statement in AI_LEARNING_CONFIDENCE_COUNT:
+        await db.execute(statement)
+
+MIGRATIONS = [
+    (1, 'base schema', _migrate_base_schema),
+    (2, 'hot query indexes', _migrate_indexes),
+    (3, 'materialized stats counters', _migrate_stats_counters),
+    (4, 'last_activity default for legacy users', _migrate_last_activity_default),
+    (5, 'non-NULL confidence counts', _migrate_confidence_count),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+async def get_schema_version(db):
+    async with db.execute('PRAGMA user_version') as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+async def run_migrations(db):
+    current = await get_schema_version(db)
+    if current >= SCHEMA_VERSION:
+        logger.info(f"Database schema is up to date (version {current})")
+        return
+
+    pending = [m for m in MIGRATIONS if m[0] > current]
+
+    await db.execute('BEGIN IMMEDIATE')
+    try:
+        for version, description, migrate in pending:
+            logger.info(f"Applying migration {version}: {description}")
+            await migrate(db)
+        await db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    logger.info(f"Database schema migrated from version {current} to {SCHEMA_VERSION}")
@@ -1,8 +1,9 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
+from .user_cache import increment_cached_user
+from .queries import USER_PHOTOS
 
 async def save_photo(user_id, file_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'INSERT INTO photos (user_id, file_id) VALUES (?, ?)',
             (user_id, file_id)
@@ -12,12 +13,9 @@ async def save_photo(user_id, file_id):
             (user_id,)
         )
         await db.commit()
+    increment_cached_user(user_id, 'photos_count')
 
 async def get_photos(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            'SELECT file_id FROM photos WHERE user_id = ? ORDER BY timestamp',
-            (user_id,)
-        ) as cursor:
+    async with get_db() as db:
+        async with db.execute(USER_PHOTOS, (user_id,)) as cursor:
             return await cursor.fetchall()
\ No newline at end of file
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import aiosqlite
+from config import DB_PATH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_connections = []
+
+async def _open_connection():
+    db = await aiosqlite.connect(DB_PATH)
+    db.row_factory = aiosqlite.Row
+    await db.execute('PRAGMA journal_mode=WAL')
+    await db.execute('PRAGMA synchronous=NORMAL')
+    await db.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}')
+    await db.execute(f'PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}')
+    await db.execute(f'PRAGMA mmap_size={int(DB_MMAP_SIZE)}')
+    await db.execute('PRAGMA temp_store=MEMORY')
+    return db
+
+async def init_pool(size=DB_POOL_SIZE):
+    global _pool
+    if _pool is not None:
+        return
+
+    pool = asyncio.Queue()
+    for _ in range(max(1, size)):
+        db = await _open_connection()
+        _connections.append(db)
+        pool.put_nowait(db)
+
+    _pool = pool
+    logger.info(f"Database pool opened with {len(_connections)} connections")
+
+async def close_pool():
+    global _pool
+    if _pool is None:
+        return
+
+    _pool = None
+    for db in _connections:
+        try:
+            await db.close()
+        except Exception as e:
+            logger.error(f"Error closing pooled connection: {e}")
+    _connections.clear()
+    logger.info("Database pool closed")
+
+@asynccontextmanager
+async def get_db():
+    if _pool is None:
+        async with aiosqlite.connect(DB_PATH) as db:
+            db.row_factory = aiosqlite.Row
+            yield db
+        return
+
+    pool = _pool
+    db = await pool.get()
+    try:
+        yield db
+    finally:
+        try:
+            if db.in_transaction:
+                await db.rollback()
+        finally:
+            pool.put_nowait(db)
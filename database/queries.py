@@ -0,0 +1,57 @@
+# Горячие запросы, для которых есть индексы; tests/test_indexes.py проверяет
+# их планы, поэтому модуль не импортирует ничего, кроме стандартной библиотеки
+
+RECENT_MESSAGES = 'SELECT * FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?'
+
+USER_CONVERSATION = 'SELECT * FROM messages WHERE user_id = ? ORDER BY id'
+
+BOT_RESPONDED = 'SELECT 1 FROM messages WHERE user_id = ? AND role = ? LIMIT 1'
+
+USER_PHOTOS = 'SELECT file_id FROM photos WHERE user_id = ? ORDER BY id'
+
+FAQ_BY_CATEGORY = 'SELECT * FROM faq WHERE category = ?'
+
+UNPROCESSED_GROUP_MESSAGES = 'SELECT * FROM group_messages WHERE processed = 0 ORDER BY timestamp'
+
+AUTO_HIDE_USERS = '''UPDATE users SET hidden_at = ?
+    WHERE hidden_at IS NULL
+    AND status IN ({statuses})
+    AND last_activity < ?'''
+
+# Признак ответа бота и последнее сообщение берутся поиском по индексу для
+# каждой строки, так что клавиатуре списка не нужны другие запросы
+USERS_LIST = '''SELECT u.user_id, u.username, u.status, u.last_activity,
+        EXISTS (
+            SELECT 1 FROM messages WHERE user_id = u.user_id AND role = 'bot'
+        ) AS bot_responded,
+        substr(lm.content, 1, 100) AS last_message,
+        lm.timestamp AS last_message_at
+    FROM users u
+    LEFT JOIN messages lm ON lm.id = (
+        SELECT MAX(id) FROM messages WHERE user_id = u.user_id
+    )
+    {where}
+    ORDER BY u.last_activity {order}, u.user_id {order} LIMIT ?'''
+
+def auto_hide_query(statuses_count):
+    return AUTO_HIDE_USERS.format(statuses=','.join('?' * statuses_count))
+
+def users_list_query(show_hidden=False, after=None, before=None):
+    """Запрос страницы списка и его параметры без LIMIT.
+
+    after/before - (last_activity, user_id) последней/первой строки соседней
+    страницы: глубокие страницы стоят столько же, сколько первая.
+    """
+    conditions = [] if show_hidden else ['u.hidden_at IS NULL']
+    params = []
+    order = 'DESC'
+    if after is not None:
+        conditions.append('(u.last_activity, u.user_id) < (?, ?)')
+        params.extend(after)
+    elif before is not None:
+        conditions.append('(u.last_activity, u.user_id) > (?, ?)')
+        params.extend(before)
+        order = 'ASC'
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return USERS_LIST.format(where=where, order=order), params
@@ -1,19 +1,36 @@
-import aiosqlite
-from config import DB_PATH
+from .pool import get_db
+
+_settings = None
+
+async def load_settings():
+    global _settings
+    async with get_db() as db:
+        async with db.execute('SELECT key, value FROM settings') as cursor:
+            _settings = {row[0]: row[1] for row in await cursor.fetchall()}
+
+def get_cached_setting(key, default=None):
+    if _settings is None:
+        return default
+    return _settings.get(key, default)
 
 async def get_setting(key):
-    async with aiosqlite.connect(DB_PATH) as db:
+    if _settings is not None:
+        return _settings.get(key)
+
+    async with get_db() as db:
         async with db.execute('SELECT value FROM settings WHERE key = ?', (key,)) as cursor:
             row = await cursor.fetchone()
             return row[0] if row else None
 
 async def set_setting(key, value):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
             (key, value)
         )
         await db.commit()
+    if _settings is not None:
+        _settings[key] = value
 
 async def init_default_settings():
     default_welcome_ru = """Приветик
@@ -215,7 +232,7 @@ Hello, my name is Anya. I am 18 years old. I live in Germany. I want to join.
     default_training_group = "https://t.me/+7crlJXEcRAk0YTUy"
     default_chat_group = "https://t.me/+GnKecVUalic2OTBi"
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', ('welcome_message_ru', default_welcome_ru))
         await db.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', ('welcome_message_uk', default_welcome_uk))
         await db.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', ('welcome_message_en', default_welcome_en))
@@ -225,3 +242,5 @@ Hello, my name is Anya. I am 18 years old. I live in Germany. I want to join.
         await db.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', ('training_group_link', default_training_group))
         await db.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', ('chat_group_link', default_chat_group))
         await db.commit()
+
+    await load_settings()
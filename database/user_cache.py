@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+from config import USER_CACHE_SIZE
+
+_cache = OrderedDict()
+_generation = 0
+
+_counts = {}
+_counts_generation = 0
+
+def get_cached_user(user_id):
+    user = _cache.get(user_id)
+    if user is None:
+        return None
+    _cache.move_to_end(user_id)
+    return dict(user)
+
+def cache_generation():
+    return _generation
+
+def store_cached_user(user_id, row, generation):
+    # Запись во время чтения - прочитанное уже устарело
+    if row is None or generation != _generation:
+        return
+    _cache[user_id] = dict(row)
+    _cache.move_to_end(user_id)
+    while len(_cache) > USER_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+def update_cached_user(user_id, **fields):
+    global _generation
+    _generation += 1
+    user = _cache.get(user_id)
+    if user is not None:
+        user.update(fields)
+
+def increment_cached_user(user_id, field, amount=1):
+    global _generation
+    _generation += 1
+    user = _cache.get(user_id)
+    if user is not None:
+        user[field] = (user.get(field) or 0) + amount
+
+def invalidate_cached_user(user_id=None):
+    global _generation
+    _generation += 1
+    if user_id is None:
+        _cache.clear()
+        invalidate_cached_counts()
+    else:
+        _cache.pop(user_id, None)
+
+def get_cached_count(key):
+    return _counts.get(key)
+
+def counts_generation():
+    return _counts_generation
+
+def store_cached_count(key, value, generation):
+    if generation != _counts_generation:
+        return
+    _counts[key] = value
+
+def invalidate_cached_counts():
+    global _counts_generation
+    _counts_generation += 1
+    _counts.clear()
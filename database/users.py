@@ -1,151 +1,197 @@
-import aiosqlite
 from datetime import datetime
-from config import DB_PATH
+from .pool import get_db
+from .write_behind import enqueue_write, flush_writes
+from .queries import BOT_RESPONDED, users_list_query
+from .user_cache import (
+    get_cached_user, cache_generation, store_cached_user,
+    update_cached_user, invalidate_cached_user,
+    get_cached_count, counts_generation, store_cached_count, invalidate_cached_counts
+)
 
 async def get_user(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    user = get_cached_user(user_id)
+    if user is not None:
+        return user
+
+    await flush_writes()
+    generation = cache_generation()
+    async with get_db() as db:
         async with db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,)) as cursor:
-            return await cursor.fetchone()
+            row = await cursor.fetchone()
+
+    if row is None:
+        return None
+    store_cached_user(user_id, row, generation)
+    return dict(row)
 
 async def create_user(user_id, username, language='ru'):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'INSERT INTO users (user_id, username, language) VALUES (?, ?, ?)',
             (user_id, username, language)
         )
         await db.commit()
+    invalidate_cached_user(user_id)
+    invalidate_cached_counts()
 
 async def update_user_status(user_id, status):
-    async with aiosqlite.connect(DB_PATH) as db:
+    now = datetime.now()
+    async with get_db() as db:
         await db.execute(
             'UPDATE users SET status = ?, last_activity = ? WHERE user_id = ?',
-            (status, datetime.now(), user_id)
+            (status, now, user_id)
         )
         await db.commit()
+    update_cached_user(user_id, status=status, last_activity=str(now))
 
 async def update_user_language(user_id, language):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'UPDATE users SET language = ? WHERE user_id = ?',
             (language, user_id)
         )
         await db.commit()
+    update_cached_user(user_id, language=language)
 
-async def get_all_users_list(page=1, per_page=10, show_hidden=False):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        offset = (page - 1) * per_page
-        if show_hidden:
-            async with db.execute(
-                'SELECT user_id, username, status FROM users ORDER BY last_activity DESC LIMIT ? OFFSET ?',
-                (per_page, offset)
-            ) as cursor:
-                return await cursor.fetchall()
-        else:
-            async with db.execute(
-                'SELECT user_id, username, status FROM users WHERE hidden_at IS NULL ORDER BY last_activity DESC LIMIT ? OFFSET ?',
-                (per_page, offset)
-            ) as cursor:
-                return await cursor.fetchall()
+async def get_all_users_list(per_page=10, show_hidden=False, after=None, before=None):
+    await flush_writes()
+
+    query, params = users_list_query(show_hidden, after, before)
+    async with get_db() as db:
+        async with db.execute(query, (*params, per_page)) as cursor:
+            rows = await cursor.fetchall()
+
+    if before is not None and after is None:
+        return list(reversed(rows))
+    return rows
 
 async def get_users_count(show_hidden=False):
-    async with aiosqlite.connect(DB_PATH) as db:
+    count = get_cached_count(show_hidden)
+    if count is not None:
+        return count
+
+    await flush_writes()
+    generation = counts_generation()
+    async with get_db() as db:
         if show_hidden:
             async with db.execute('SELECT COUNT(*) FROM users') as cursor:
                 result = await cursor.fetchone()
-                return result[0] if result else 0
         else:
             async with db.execute('SELECT COUNT(*) FROM users WHERE hidden_at IS NULL') as cursor:
                 result = await cursor.fetchone()
-                return result[0] if result else 0
+
+    count = result[0] if result else 0
+    store_cached_count(show_hidden, count, generation)
+    return count
 
 async def delete_user_conversation(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    await flush_writes()
+    async with get_db() as db:
         await db.execute('DELETE FROM messages WHERE user_id = ?', (user_id,))
         await db.execute('DELETE FROM pending_questions WHERE user_id = ?', (user_id,))
         await db.commit()
 
 async def is_user_in_groups(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('SELECT in_groups FROM users WHERE user_id = ?', (user_id,)) as cursor:
-            result = await cursor.fetchone()
-            return result and result[0] == 1
+    user = await get_user(user_id)
+    return user and user['in_groups'] == 1
 
 async def add_user_to_groups(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'UPDATE users SET in_groups = 1 WHERE user_id = ?',
             (user_id,)
         )
         await db.commit()
+    update_cached_user(user_id, in_groups=1)
 
 async def hide_user(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    await flush_writes()
+    now = datetime.now()
+    async with get_db() as db:
         await db.execute(
             'UPDATE users SET hidden_at = ? WHERE user_id = ?',
-            (datetime.now(), user_id)
+            (now, user_id)
         )
         await db.commit()
+    update_cached_user(user_id, hidden_at=str(now))
+    invalidate_cached_counts()
 
 async def unhide_user(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         await db.execute(
             'UPDATE users SET hidden_at = NULL WHERE user_id = ?',
             (user_id,)
         )
         await db.commit()
+    update_cached_user(user_id, hidden_at=None)
+    invalidate_cached_counts()
 
 async def unhide_user_on_activity(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            'UPDATE users SET hidden_at = NULL, last_activity = ? WHERE user_id = ? AND hidden_at IS NOT NULL',
-            (datetime.now(), user_id)
-        )
-        await db.commit()
+    now = datetime.now()
+    enqueue_write(
+        'UPDATE users SET hidden_at = NULL, last_activity = ? WHERE user_id = ? AND hidden_at IS NOT NULL',
+        (now, user_id)
+    )
+
+    user = get_cached_user(user_id)
+    if user is None or user['hidden_at'] is not None:
+        invalidate_cached_counts()
+    if user is not None and user['hidden_at'] is not None:
+        update_cached_user(user_id, hidden_at=None, last_activity=str(now))
 
 async def has_bot_responded(user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            'SELECT 1 FROM messages WHERE user_id = ? AND role = ? LIMIT 1',
-            (user_id, 'bot')
-        ) as cursor:
+    await flush_writes()
+    async with get_db() as db:
+        async with db.execute(BOT_RESPONDED, (user_id, 'bot')) as cursor:
             row = await cursor.fetchone()
             return row is not None
 
 async def get_stats():
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('SELECT COUNT(*) FROM users') as cursor:
-            total = (await cursor.fetchone())[0]
-        
-        async with db.execute('SELECT COUNT(*) FROM users WHERE status="approved"') as cursor:
-            approved = (await cursor.fetchone())[0]
-        
-        async with db.execute('SELECT COUNT(*) FROM users WHERE status="rejected"') as cursor:
-            rejected = (await cursor.fetchone())[0]
-        
-        async with db.execute('SELECT COUNT(*) FROM users WHERE status="pending_review"') as cursor:
-            pending = (await cursor.fetchone())[0]
-        
-        async with db.execute('SELECT COUNT(*) FROM users WHERE status="registered"') as cursor:
-            registered = (await cursor.fetchone())[0]
-        
-        async with db.execute('SELECT COUNT(*) FROM ai_learning WHERE source="admin"') as cursor:
-            admin_answers = (await cursor.fetchone())[0]
-        
-        async with db.execute('SELECT COUNT(*) FROM ai_learning WHERE source="auto"') as cursor:
-            auto_answers = (await cursor.fetchone())[0]
-        
-        async with db.execute('SELECT AVG(confidence) FROM ai_learning WHERE source="auto"') as cursor:
-            avg_confidence = (await cursor.fetchone())[0] or 0
-        
-        return {
-            'total': total,
-            'approved': approved,
-            'rejected': rejected,
-            'pending': pending,
-            'registered': registered,
-            'admin_answers': admin_answers,
-            'auto_answers': auto_answers,
-            'avg_confidence': round(avg_confidence, 1)
-        }
\ No newline at end of file
+    await flush_writes()
+    async with get_db() as db:
+        async with db.execute('SELECT status, count FROM user_status_counts') as cursor:
+            statuses = {row[0]: row[1] for row in await cursor.fetchall()}
+
+        async with db.execute(
+            'SELECT source, count, confidence_sum, confidence_count FROM ai_learning_counts'
+        ) as cursor:
+            sources = {row[0]: (row[1], row[2], row[3]) for row in await cursor.fetchall()}
+
+        async with db.execute('''
+            SELECT
+                SUM(CASE WHEN day = date('now') THEN count ELSE 0 END),
+                SUM(CASE WHEN day >= date('now', '-6 days') THEN count ELSE 0 END),
+                SUM(count)
+            FROM user_daily_counts WHERE day >= date('now', '-29 days')
+        ''') as cursor:
+            users_window = await cursor.fetchone()
+
+        async with db.execute('''
+            SELECT
+                SUM(CASE WHEN day = date('now') THEN count ELSE 0 END),
+                SUM(CASE WHEN day >= date('now', '-6 days') THEN count ELSE 0 END),
+                SUM(count)
+            FROM ai_learning_daily_counts WHERE source = 'auto' AND day >= date('now', '-29 days')
+        ''') as cursor:
+            answers_window = await cursor.fetchone()
+
+    admin_answers, _, _ = sources.get('admin', (0, 0, 0))
+    auto_answers, auto_confidence_sum, auto_confidence_count = sources.get('auto', (0, 0, 0))
+    avg_confidence = auto_confidence_sum / auto_confidence_count if auto_confidence_count else 0
+
+    return {
+        'total': sum(statuses.values()),
+        'approved': statuses.get('approved', 0),
+        'rejected': statuses.get('rejected', 0),
+        'pending': statuses.get('pending_review', 0),
+        'registered': statuses.get('registered', 0),
+        'admin_answers': admin_answers,
+        'auto_answers': auto_answers,
+        'avg_confidence': round(avg_confidence, 1),
+        'new_users_today': users_window[0] or 0,
+        'new_users_7d': users_window[1] or 0,
+        'new_users_30d': users_window[2] or 0,
+        'auto_answers_today': answers_window[0] or 0,
+        'auto_answers_7d': answers_window[1] or 0,
+        'auto_answers_30d': answers_window[2] or 0,
+    }
@@ -0,0 +1,8 @@
+# Счётчики изменений таблиц для производных кэшей
+_versions = {}
+
+def data_version(name):
+    return _versions.get(name, 0)
+
+def bump_data_version(name):
+    _versions[name] = data_version(name) + 1
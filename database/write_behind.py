@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import sqlite3
+
+from config import WRITE_BEHIND_DELAY_MS, WRITE_BEHIND_MAX_ROWS, WRITE_BEHIND_MAX_RETRIES
+from .pool import get_db
+
+logger = logging.getLogger(__name__)
+
+_pending = []
+_flush_lock = None
+_flush_task = None
+_batch_full = None
+_failed_flushes = 0
+
+def _get_lock():
+    global _flush_lock
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+    return _flush_lock
+
+async def _flush_soon(batch_full):
+    global _flush_task
+    try:
+        await asyncio.wait_for(batch_full.wait(), timeout=WRITE_BEHIND_DELAY_MS / 1000)
+    except asyncio.TimeoutError:
+        pass
+
+    _flush_task = None
+    try:
+        await flush_writes()
+    except Exception as e:
+        logger.error(f"Write-behind flush failed: {e}", exc_info=True)
+
+def _is_transient(error):
+    # БД занята другим соединением дольше busy_timeout
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+def _schedule_flush():
+    global _flush_task, _batch_full
+    if _flush_task is None:
+        _batch_full = asyncio.Event()
+        _flush_task = asyncio.create_task(_flush_soon(_batch_full))
+
+def enqueue_write(sql, params):
+    _pending.append((sql, params))
+    _schedule_flush()
+
+    if len(_pending) >= WRITE_BEHIND_MAX_ROWS:
+        _batch_full.set()
+
+async def flush_writes():
+    """Пишет накопленные строки в БД.
+
+    Не бросает исключений: читатели вызывают её перед каждым запросом, и
+    чужая неудачная запись не должна ломать их чтение. Занятую БД пробуем
+    ещё раз позже, остальные ошибки логируем и отбрасываем запись.
+    """
+    global _failed_flushes
+    lock = _get_lock()
+    if not _pending and not lock.locked():
+        return
+
+    async with lock:
+        if not _pending:
+            return
+
+        batch = list(_pending)
+        _pending.clear()
+
+        dropped = 0
+        try:
+            async with get_db() as db:
+                for sql, params in batch:
+                    try:
+                        await db.execute(sql, params)
+                    except sqlite3.Error as e:
+                        if _is_transient(e):
+                            raise
+                        # Откатывается только упавшая запись, остальные сохраняются
+                        dropped += 1
+                        logger.error(f"Write-behind dropped {sql!r} {params!r}: {e}")
+                await db.commit()
+        except Exception as e:
+            if _is_transient(e) and _failed_flushes < WRITE_BEHIND_MAX_RETRIES:
+                _failed_flushes += 1
+                _pending[:0] = batch
+                logger.warning(f"Write-behind flush of {len(batch)} writes postponed ({_failed_flushes}): {e}")
+                _schedule_flush()
+            else:
+                _failed_flushes = 0
+                logger.error(f"Write-behind lost {len(batch)} writes: {e}", exc_info=True)
+            return
+
+        _failed_flushes = 0
+        logger.debug(f"Write-behind flushed {len(batch) - dropped} writes")
@@ -1,7 +1,7 @@
 import logging
 import json
 import math
-from datetime import datetime
+import os
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, FSInputFile
@@ -12,11 +12,17 @@ from states import AdminStates, UserStates
 from keyboards import (
     admin_main_menu, conversation_keyboard,
     forbidden_topics_keyboard, cancel_keyboard, conversations_action_keyboard,
-    delete_conversation_confirm_keyboard, group_links_keyboard
+    delete_conversation_confirm_keyboard, group_links_keyboard, export_format_keyboard
 )
 from keyboards.admin import users_list_keyboard
+from utils.export import export_conversations
+from utils.answer_cache import get_answer_cache_stats
+from utils.llm import get_provider_stats
+from utils.provider_scoreboard import format_scoreboard
+from utils.admission import admission, format_admission_stats
+from utils.ai_handler import ai_breaker
 from database import (
-    get_setting, set_setting, save_ai_learning,
+    get_cached_setting, set_setting, save_ai_learning,
     get_pending_question, delete_pending_question, get_stats,
     get_user_conversations, get_all_users_list, get_user, get_users_count,
     get_forbidden_topics_from_db, add_forbidden_topic, delete_forbidden_topic,
@@ -27,6 +33,19 @@ from database import (
 router = Router()
 logger = logging.getLogger(__name__)
 
+def parse_page_cursor(data):
+    # page_{action}_{n|p}_{page}_{last_activity}_{user_id}
+    # Кнопки старого формата (page_view_2) открывают первую страницу
+    try:
+        _, _, direction, page, last_activity, user_id = data.split("_")
+        cursor = (last_activity, int(user_id))
+        page = int(page)
+    except ValueError:
+        return 1, None, None
+    if direction == 'p':
+        return page, None, cursor
+    return page, cursor, None
+
 MAIN_MENU_BUTTONS = ["📝 Изменить приветствие", "📊 Статистика", "💬 Переписки", 
                      "✉️ Написать девушке", "📋 Логи", "🚫 Запретные темы", 
                      "📥 Экспорт переписок", "🔗 Ссылки на группы", "🔙 Отмена"]
@@ -109,8 +128,8 @@ async def show_group_links_menu(message: Message, state: FSMContext):
     
     await state.clear()
     
-    training_link = await get_setting('training_group_link')
-    chat_link = await get_setting('chat_group_link')
+    training_link = get_cached_setting('training_group_link')
+    chat_link = get_cached_setting('chat_group_link')
     
     text = f"""🔗 Текущие ссылки на группы:
 
@@ -186,6 +205,7 @@ async def show_stats_menu(message: Message, state: FSMContext):
     await state.clear()
     
     stats = await get_stats()
+    cache_stats = get_answer_cache_stats()
     
     ai_efficiency = 0
     if stats['admin_answers'] + stats['auto_answers'] > 0:
@@ -199,11 +219,21 @@ async def show_stats_menu(message: Message, state: FSMContext):
 ⏳ На рассмотрении: {stats['pending']}
 📝 Зарегистрировано: {stats['registered']}
 
+📅 Новые пользователи:
+▫️ Сегодня: {stats['new_users_today']}
+▫️ За 7 дней: {stats['new_users_7d']}
+▫️ За 30 дней: {stats['new_users_30d']}
+
 🤖 Эффективность ИИ:
 ▫️ Самостоятельных ответов: {stats['auto_answers']}
 ▫️ Ответов админа: {stats['admin_answers']}
 ▫️ Процент автономности: {ai_efficiency}%
-▫️ Средний confidence: {stats['avg_confidence']}%"""
+▫️ Средний confidence: {stats['avg_confidence']}%
+▫️ Ответов ИИ сегодня / 7 дней / 30 дней: {stats['auto_answers_today']} / {stats['auto_answers_7d']} / {stats['auto_answers_30d']}
+
+💾 Кэш ответов:
+▫️ Попаданий / промахов: {cache_stats['hits']} / {cache_stats['misses']} ({cache_stats['hit_rate']}%)
+▫️ Ответов в кэше: {cache_stats['size']}"""
     
     await message.answer(stats_text, reply_markup=admin_main_menu())
 
@@ -243,14 +273,14 @@ async def show_conversations_list(callback: CallbackQuery, state: FSMContext):
     per_page = 10
     total_pages = max(1, math.ceil(total_users / per_page))
     
-    users = await get_all_users_list(page=1, per_page=per_page, show_hidden=False)
+    users = await get_all_users_list(per_page=per_page, show_hidden=False)
     
     if not users:
         await callback.message.edit_text("Нет активных пользователей в списке")
         await callback.answer()
         return
     
-    keyboard = await users_list_keyboard(users, action='view', page=1, total_pages=total_pages)
+    keyboard = users_list_keyboard(users, action='view', page=1, total_pages=total_pages)
     await callback.message.edit_text(
         f"💬 Выберите пользователя для просмотра переписки (Страница 1/{total_pages}):",
         reply_markup=keyboard
@@ -262,14 +292,14 @@ async def paginate_conversations(callback: CallbackQuery, state: FSMContext):
     if callback.from_user.id != ADMIN_ID:
         return
     
-    page = int(callback.data.split("_")[2])
+    page, after, before = parse_page_cursor(callback.data)
     per_page = 10
     total_users = await get_users_count(show_hidden=False)
     total_pages = max(1, math.ceil(total_users / per_page))
     
-    users = await get_all_users_list(page=page, per_page=per_page, show_hidden=False)
+    users = await get_all_users_list(per_page=per_page, show_hidden=False, after=after, before=before)
     
-    keyboard = await users_list_keyboard(users, action='view', page=page, total_pages=total_pages)
+    keyboard = users_list_keyboard(users, action='view', page=page, total_pages=total_pages)
     await callback.message.edit_text(
         f"💬 Выберите пользователя для просмотра переписки (Страница {page}/{total_pages}):",
         reply_markup=keyboard
@@ -287,14 +317,14 @@ async def show_delete_conversations_list(callback: CallbackQuery, state: FSMCont
     per_page = 10
     total_pages = max(1, math.ceil(total_users / per_page))
     
-    users = await get_all_users_list(page=1, per_page=per_page, show_hidden=False)
+    users = await get_all_users_list(per_page=per_page, show_hidden=False)
     
     if not users:
         await callback.message.edit_text("Нет активных пользователей в списке")
         await callback.answer()
         return
     
-    keyboard = await users_list_keyboard(users, action='delete', page=1, total_pages=total_pages)
+    keyboard = users_list_keyboard(users, action='delete', page=1, total_pages=total_pages)
     await callback.message.edit_text(
         f"🗑 Выберите пользователя для удаления переписки (Страница 1/{total_pages}):",
         reply_markup=keyboard
@@ -306,14 +336,14 @@ async def paginate_delete_conversations(callback: CallbackQuery, state: FSMConte
     if callback.from_user.id != ADMIN_ID:
         return
     
-    page = int(callback.data.split("_")[2])
+    page, after, before = parse_page_cursor(callback.data)
     per_page = 10
     total_users = await get_users_count(show_hidden=False)
     total_pages = max(1, math.ceil(total_users / per_page))
     
-    users = await get_all_users_list(page=page, per_page=per_page, show_hidden=False)
+    users = await get_all_users_list(per_page=per_page, show_hidden=False, after=after, before=before)
     
-    keyboard = await users_list_keyboard(users, action='delete', page=page, total_pages=total_pages)
+    keyboard = users_list_keyboard(users, action='delete', page=page, total_pages=total_pages)
     await callback.message.edit_text(
         f"🗑 Выберите пользователя для удаления переписки (Страница {page}/{total_pages}):",
         reply_markup=keyboard
@@ -384,13 +414,13 @@ async def write_to_user_menu(message: Message, state: FSMContext):
     per_page = 10
     total_pages = max(1, math.ceil(total_users / per_page))
     
-    users = await get_all_users_list(page=1, per_page=per_page, show_hidden=False)
+    users = await get_all_users_list(per_page=per_page, show_hidden=False)
     
     if not users:
         await message.answer("Нет активных пользователей в списке", reply_markup=admin_main_menu())
         return
     
-    keyboard = await users_list_keyboard(users, action='write', page=1, total_pages=total_pages)
+    keyboard = users_list_keyboard(users, action='write', page=1, total_pages=total_pages)
     await message.answer(
         f"✉️ Выберите пользователя для отправки сообщения (Страница 1/{total_pages}):",
         reply_markup=keyboard
@@ -401,14 +431,14 @@ async def paginate_write_users(callback: CallbackQuery, state: FSMContext):
     if callback.from_user.id != ADMIN_ID:
         return
     
-    page = int(callback.data.split("_")[2])
+    page, after, before = parse_page_cursor(callback.data)
     per_page = 10
     total_users = await get_users_count(show_hidden=False)
     total_pages = max(1, math.ceil(total_users / per_page))
     
-    users = await get_all_users_list(page=page, per_page=per_page, show_hidden=False)
+    users = await get_all_users_list(per_page=per_page, show_hidden=False, after=after, before=before)
     
-    keyboard = await users_list_keyboard(users, action='write', page=page, total_pages=total_pages)
+    keyboard = users_list_keyboard(users, action='write', page=page, total_pages=total_pages)
     await callback.message.edit_text(
         f"✉️ Выберите пользователя для отправки сообщения (Страница {page}/{total_pages}):",
         reply_markup=keyboard
@@ -434,6 +464,19 @@ async def send_logs_menu(message: Message, state: FSMContext):
     except Exception as e:
         await message.answer(f"Ошибка при отправке логов: {e}", reply_markup=admin_main_menu())
 
+@router.message(Command("providers"))
+async def cmd_providers(message: Message):
+    if message.from_user.id != ADMIN_ID:
+        return
+    
+    breaker = ai_breaker.stats()
+    await message.answer(
+        f"🛰 Провайдеры ИИ:\n\n{format_scoreboard(get_provider_stats())}\n\n"
+        f"🚦 Очередь запросов:\n{format_admission_stats(admission.stats())}\n\n"
+        f"⚡️ Предохранитель ИИ: {breaker['state']}, ошибок {breaker['failure_rate']}% "
+        f"из {breaker['calls']}, срабатываний: {breaker['trips']}"
+    )
+
 @router.message(F.text == "🚫 Запретные темы")
 async def show_forbidden_topics_menu(message: Message, state: FSMContext):
     if message.from_user.id != ADMIN_ID:
@@ -466,59 +509,38 @@ async def export_conversations_menu(message: Message, state: FSMContext):
         return
     
     await state.clear()
+    await message.answer("📥 Выберите формат экспорта:", reply_markup=export_format_keyboard())
+
+@router.callback_query(F.data.startswith("export_"))
+async def export_conversations_handler(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != ADMIN_ID:
+        return
+    
+    fmt = callback.data.split("_", 1)[1]
+    await callback.answer("Экспорт запущен")
     
+    path = None
     try:
-        total_users = await get_users_count(show_hidden=True)
-        all_users = []
-        per_page = 50
-        total_pages = math.ceil(total_users / per_page)
-        
-        for page in range(1, total_pages + 1):
-            users = await get_all_users_list(page=page, per_page=per_page, show_hidden=True)
-            all_users.extend(users)
+        path, users_count, messages_count = await export_conversations(fmt)
         
-        if not all_users:
-            await message.answer("Нет пользователей для экспорта", reply_markup=admin_main_menu())
+        if not messages_count:
+            await callback.message.answer("Нет переписок для экспорта", reply_markup=admin_main_menu())
             return
         
-        export_text = f"Экспорт переписок - {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
-        export_text += "=" * 80 + "\n\n"
-        
-        for user in all_users:
-            messages = await get_user_conversations(user['user_id'])
-            
-            if not messages:
-                continue
-            
-            export_text += f"\n{'='*80}\n"
-            export_text += f"Пользователь: @{user['username']}\n"
-            export_text += f"Статус: {user['status']}\n"
-            export_text += f"{'='*80}\n\n"
-            
-            for msg in messages:
-                role_emoji = "👤" if msg['role'] == 'user' else "🔵"
-                export_text += f"{role_emoji} {msg['role']} [{msg['timestamp']}]:\n{msg['content']}\n\n"
-        
-        filename = f"conversations_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(export_text)
-        
-        export_file = FSInputFile(filename)
-        await message.answer_document(
-            export_file,
-            caption="📥 Экспорт всех переписок",
+        await callback.message.answer_document(
+            FSInputFile(path),
+            caption=f"📥 Экспорт всех переписок ({users_count} пользователей, {messages_count} сообщений)",
             reply_markup=admin_main_menu()
         )
         
-        import os
-        os.remove(filename)
-        
         logger.info("Admin exported conversations")
         
     except Exception as e:
-        await message.answer(f"Ошибка при экспорте: {e}", reply_markup=admin_main_menu())
+        await callback.message.answer(f"Ошибка при экспорте: {e}", reply_markup=admin_main_menu())
         logger.error(f"Export error: {e}")
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
 
 @router.callback_query(F.data.startswith("answer_"))
 async def admin_answer_callback(callback: CallbackQuery, state: FSMContext):
@@ -733,14 +755,14 @@ async def back_to_conversations(callback: CallbackQuery, state: FSMContext):
     per_page = 10
     total_pages = max(1, math.ceil(total_users / per_page))
     
-    users = await get_all_users_list(page=1, per_page=per_page, show_hidden=False)
+    users = await get_all_users_list(per_page=per_page, show_hidden=False)
     
     if not users:
         await callback.message.answer("Нет активных пользователей в списке")
         await callback.answer()
         return
     
-    keyboard = await users_list_keyboard(users, action='view', page=1, total_pages=total_pages)
+    keyboard = users_list_keyboard(users, action='view', page=1, total_pages=total_pages)
     await callback.message.answer(
         f"💬 Выберите пользователя для просмотра переписки (Страница 1/{total_pages}):",
         reply_markup=keyboard
@@ -67,8 +67,10 @@ async def process_analysis_task(message: Message, bot):
     from database.group_messages import get_unprocessed_messages, mark_message_processed
     from utils.audio_transcription import transcribe_audio
     from utils.translator import translate_ru_to_uk_en
+    from utils.materials_index import rebuild_materials_index, clear_materials_index
 
     await clear_analysis_data()
+    clear_materials_index()
 
     messages = await get_unprocessed_messages()
 
@@ -281,6 +283,8 @@ async def process_analysis_task(message: Message, bot):
     except Exception as e:
         logger.error(f"Error during analysis: {e}", exc_info=True)
         await message.answer(f"❌ Ошибка при анализе: {e}")
+    finally:
+        await rebuild_materials_index()
 
 @router.message(Command("startanal"))
 async def cmd_start_analysis(message: Message, bot):
@@ -299,9 +303,11 @@ async def cmd_clear_analysis(message: Message):
 
     from database.group_messages import clear_group_messages
     from database.analysis import clear_analysis_data
+    from utils.materials_index import clear_materials_index
 
     await clear_group_messages()
     await clear_analysis_data()
+    clear_materials_index()
     
     for directory in [ANALYSIS_TEXT_DIR, ANALYSIS_AUDIO_DIR, ANALYSIS_VIDEO_DIR]:
         if os.path.exists(directory):
@@ -6,7 +6,7 @@ from aiogram.fsm.storage.base import StorageKey
 
 from states import UserStates
 from database import (
-    update_application_status, update_user_status, get_setting, 
+    update_application_status, update_user_status, get_cached_setting, 
     save_message, get_user
 )
 from keyboards import groups_keyboard
@@ -135,7 +135,7 @@ async def reject_application(callback: CallbackQuery, bot, state: FSMContext):
     user_state = FSMContext(storage=state.storage, key=user_state_key)
     await user_state.set_state(UserStates.rejected)
     
-    rejection_msg = await get_setting('rejection_message')
+    rejection_msg = get_cached_setting('rejection_message')
     await bot.send_message(user_id, rejection_msg)
     await save_message(user_id, 'bot', rejection_msg)
     
@@ -4,6 +4,8 @@ from aiogram import Router, F
 from aiogram.types import Message, FSInputFile
 from aiogram.fsm.context import FSMContext
 
+from utils.keyword_matcher import KeywordMatcher
+
 router = Router()
 logger = logging.getLogger(__name__)
 
@@ -46,12 +48,10 @@ REVIEW_KEYWORDS = {
     ]
 }
 
+REVIEW_MATCHER = KeywordMatcher(REVIEW_KEYWORDS)
+
 def is_review_request(text: str) -> bool:
-    text_lower = text.lower()
-    for lang_keywords in REVIEW_KEYWORDS.values():
-        if any(keyword in text_lower for keyword in lang_keywords):
-            return True
-    return False
+    return bool(REVIEW_MATCHER.match_groups(text.lower()))
 
 async def send_reviews(message: Message, user_lang='ru'):
     try:
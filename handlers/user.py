@@ -10,11 +10,14 @@ from states import UserStates
 from keyboards import admin_answer_keyboard
 from database import (
     get_user, create_user, update_user_status, save_message, update_user_language,
-    save_photo, get_setting, save_ai_learning, save_pending_question,
+    save_photo, get_cached_setting, save_ai_learning, save_pending_question,
     is_user_in_groups, add_user_to_groups, unhide_user_on_activity, has_bot_responded
 )
-from utils.ai_handler import get_ai_response_with_retry
+from utils.ai_handler import get_ai_response_with_retry, build_request_context
+from utils.message_coalescer import collect_message, run_coalesced, discard_burst
+from utils.progressive_reply import ProgressiveReply
 from handlers.reviews import is_review_request, send_reviews
+from utils.keyword_matcher import KeywordMatcher
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -29,6 +32,8 @@ REGISTRATION_INTENT_PATTERNS = [
     'sign up', 'signup',
 ]
 
+REGISTRATION_INTENT_MATCHER = KeywordMatcher({'registration': REGISTRATION_INTENT_PATTERNS})
+
 async def is_user_rejected(user_id):
     user = await get_user(user_id)
     return user and user['status'] == 'rejected'
@@ -53,7 +58,7 @@ async def check_group_membership(bot, user_id):
 
 def is_registration_intent(text):
     text_lower = text.lower().strip()
-    return any(pattern in text_lower for pattern in REGISTRATION_INTENT_PATTERNS)
+    return 'registration' in REGISTRATION_INTENT_MATCHER.match_groups(text_lower)
 
 def get_already_registered_text(user_lang):
     texts = {
@@ -175,9 +180,9 @@ Choose language - type en"""
         await update_user_status(user_id, 'chatting')
         await state.set_state(UserStates.chatting)
 
-        welcome_msg = await get_setting(f'welcome_message_{chosen_lang}')
+        welcome_msg = get_cached_setting(f'welcome_message_{chosen_lang}')
         if not welcome_msg:
-            welcome_msg = await get_setting('welcome_message_ru')
+            welcome_msg = get_cached_setting('welcome_message_ru')
 
         await message.answer(welcome_msg)
         await save_message(user_id, 'bot', welcome_msg)
@@ -428,22 +433,41 @@ async def handle_registration_questions(message: Message, state: FSMContext, bot
 
     await save_message(user_id, 'user', question)
 
-    await bot.send_chat_action(user_id, "typing")
-
-    in_groups = await is_user_in_groups(user_id)
-    if not in_groups:
-        in_groups = await check_group_membership(bot, user_id)
+    question, burst_token = await collect_message(user_id, question)
+    if question is None:
+        return
 
-    import time
-    start_time = time.time()
+    try:
+        await bot.send_chat_action(user_id, "typing")
+
+        in_groups = await is_user_in_groups(user_id)
+        if not in_groups:
+            in_groups = await check_group_membership(bot, user_id)
+
+        import time
+        start_time = time.time()
+
+        context = await build_request_context(user_id, question, in_groups)
+        reply = ProgressiveReply(message)
+        ai_result = await run_coalesced(
+            user_id, burst_token,
+            get_ai_response_with_retry(
+                user_id, question, is_in_groups=in_groups, on_partial=reply.update, context=context
+            )
+        )
+    finally:
+        discard_burst(user_id, burst_token)
 
-    ai_result = await get_ai_response_with_retry(user_id, question, is_in_groups=in_groups)
+    if ai_result is None:
+        await reply.discard()
+        return
 
     elapsed = time.time() - start_time
     if elapsed < 1:
         await asyncio.sleep(1 - elapsed)
 
     if ai_result['escalate'] or ai_result['confidence'] < AI_CONFIDENCE_THRESHOLD:
+        await reply.discard()
         await save_pending_question(user_id, question)
 
         user_display = get_user_display_name({
@@ -468,7 +492,7 @@ async def handle_registration_questions(message: Message, state: FSMContext, bot
         await save_message(user_id, 'bot', escalate_text)
     else:
         answer = ai_result['answer']
-        await message.answer(answer)
+        await reply.finish(answer)
         await save_message(user_id, 'bot', answer)
         await save_ai_learning(question, answer, 'auto', ai_result['confidence'])
 
@@ -561,22 +585,41 @@ async def handle_registered_user(message: Message, state: FSMContext, bot):
 
     await save_message(user_id, 'user', question)
 
-    in_groups = await is_user_in_groups(user_id)
-    if not in_groups:
-        in_groups = await check_group_membership(bot, user_id)
-
-    await bot.send_chat_action(user_id, "typing")
+    question, burst_token = await collect_message(user_id, question)
+    if question is None:
+        return
 
-    import time
-    start_time = time.time()
+    try:
+        in_groups = await is_user_in_groups(user_id)
+        if not in_groups:
+            in_groups = await check_group_membership(bot, user_id)
+
+        await bot.send_chat_action(user_id, "typing")
+
+        import time
+        start_time = time.time()
+
+        context = await build_request_context(user_id, question, in_groups)
+        reply = ProgressiveReply(message)
+        ai_result = await run_coalesced(
+            user_id, burst_token,
+            get_ai_response_with_retry(
+                user_id, question, is_in_groups=in_groups, on_partial=reply.update, context=context
+            )
+        )
+    finally:
+        discard_burst(user_id, burst_token)
 
-    ai_result = await get_ai_response_with_retry(user_id, question, is_in_groups=in_groups)
+    if ai_result is None:
+        await reply.discard()
+        return
 
     elapsed = time.time() - start_time
     if elapsed < 1:
         await asyncio.sleep(1 - elapsed)
 
     if ai_result['escalate'] or ai_result['confidence'] < AI_CONFIDENCE_THRESHOLD:
+        await reply.discard()
         await update_user_status(user_id, 'waiting_admin')
         await state.set_state(UserStates.waiting_admin)
 
@@ -604,7 +647,7 @@ async def handle_registered_user(message: Message, state: FSMContext, bot):
         await save_message(user_id, 'bot', escalate_text)
     else:
         answer = ai_result['answer']
-        await message.answer(answer)
+        await reply.finish(answer)
         await save_message(user_id, 'bot', answer)
         await save_ai_learning(question, answer, 'auto', ai_result['confidence'])
 
@@ -660,22 +703,41 @@ async def handle_question(message: Message, state: FSMContext, bot):
 
     await save_message(user_id, 'user', question)
 
-    in_groups = await is_user_in_groups(user_id)
-    if not in_groups:
-        in_groups = await check_group_membership(bot, user_id)
-
-    await bot.send_chat_action(user_id, "typing")
+    question, burst_token = await collect_message(user_id, question)
+    if question is None:
+        return
 
-    import time
-    start_time = time.time()
+    try:
+        in_groups = await is_user_in_groups(user_id)
+        if not in_groups:
+            in_groups = await check_group_membership(bot, user_id)
+
+        await bot.send_chat_action(user_id, "typing")
+
+        import time
+        start_time = time.time()
+
+        context = await build_request_context(user_id, question, in_groups)
+        reply = ProgressiveReply(message)
+        ai_result = await run_coalesced(
+            user_id, burst_token,
+            get_ai_response_with_retry(
+                user_id, question, is_in_groups=in_groups, on_partial=reply.update, context=context
+            )
+        )
+    finally:
+        discard_burst(user_id, burst_token)
 
-    ai_result = await get_ai_response_with_retry(user_id, question, is_in_groups=in_groups)
+    if ai_result is None:
+        await reply.discard()
+        return
 
     elapsed = time.time() - start_time
     if elapsed < 1:
         await asyncio.sleep(1 - elapsed)
 
     if ai_result['escalate'] or ai_result['confidence'] < AI_CONFIDENCE_THRESHOLD:
+        await reply.discard()
         await update_user_status(user_id, 'waiting_admin')
         await state.set_state(UserStates.waiting_admin)
 
@@ -703,7 +765,7 @@ async def handle_question(message: Message, state: FSMContext, bot):
         await save_message(user_id, 'bot', escalate_text)
     else:
         answer = ai_result['answer']
-        await message.answer(answer)
+        await reply.finish(answer)
         await save_message(user_id, 'bot', answer)
         await save_ai_learning(question, answer, 'auto', ai_result['confidence'])
 
@@ -9,7 +9,8 @@ from .admin import (
     cancel_keyboard,
     conversations_action_keyboard,
     delete_conversation_confirm_keyboard,
-    group_links_keyboard
+    group_links_keyboard,
+    export_format_keyboard
 )
 from .user import groups_keyboard
 
@@ -25,5 +26,6 @@ __all__ = [
     'conversations_action_keyboard',
     'delete_conversation_confirm_keyboard',
     'group_links_keyboard',
+    'export_format_keyboard',
     'groups_keyboard'
 ]
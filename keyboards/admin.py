@@ -1,6 +1,5 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.types import InlineKeyboardButton, KeyboardButton, ReplyKeyboardMarkup
-from database.users import has_bot_responded
 
 def admin_review_keyboard(user_id):
     builder = InlineKeyboardBuilder()
@@ -79,7 +78,7 @@ def conversations_action_keyboard():
     )
     return builder.as_markup()
 
-async def users_list_keyboard(users, action='view', page=1, total_pages=1):
+def users_list_keyboard(users, action='view', page=1, total_pages=1):
     builder = InlineKeyboardBuilder()
 
     status_emojis = {
@@ -96,28 +95,43 @@ async def users_list_keyboard(users, action='view', page=1, total_pages=1):
 
     for user in users:
         status_emoji = status_emojis.get(user['status'], '❓')
-        bot_responded = await has_bot_responded(user['user_id'])
-        bot_indicator = ' 🔵' if bot_responded else ''
+        bot_indicator = ' 🔵' if user['bot_responded'] else ''
 
         username_display = f"@{user['username']}" if user['username'] else f"User {user['user_id']}"
 
+        preview = ''
+        if user['last_message']:
+            text = ' '.join(user['last_message'].split())
+            if len(text) > 25:
+                text = text[:25] + '…'
+            preview = f" · {str(user['last_message_at'])[5:16]} {text}"
+
         callback_prefix = 'write' if action == 'write' else 'view_conv' if action == 'view' else 'delete_conv'
 
         builder.row(
             InlineKeyboardButton(
-                text=f"{status_emoji}{bot_indicator} {username_display}",
+                text=f"{status_emoji}{bot_indicator} {username_display}{preview}",
                 callback_data=f"{callback_prefix}_{user['user_id']}"
             )
         )
     
+    # Курсор страницы - (last_activity, user_id) крайней строки
     navigation_buttons = []
-    if page > 1:
+    if page > 1 and users:
+        first = users[0]
         navigation_buttons.append(
-            InlineKeyboardButton(text="◀️ Назад", callback_data=f"page_{action}_{page-1}")
+            InlineKeyboardButton(
+                text="◀️ Назад",
+                callback_data=f"page_{action}_p_{page-1}_{first['last_activity']}_{first['user_id']}"
+            )
         )
-    if page < total_pages:
+    if page < total_pages and users:
+        last = users[-1]
         navigation_buttons.append(
-            InlineKeyboardButton(text="Вперед ▶️", callback_data=f"page_{action}_{page+1}")
+            InlineKeyboardButton(
+                text="Вперед ▶️",
+                callback_data=f"page_{action}_n_{page+1}_{last['last_activity']}_{last['user_id']}"
+            )
         )
     
     if navigation_buttons:
@@ -129,6 +143,15 @@ async def users_list_keyboard(users, action='view', page=1, total_pages=1):
     
     return builder.as_markup()
 
+def export_format_keyboard():
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="📄 TXT", callback_data="export_txt"),
+        InlineKeyboardButton(text="🧾 JSONL", callback_data="export_jsonl"),
+        InlineKeyboardButton(text="📊 CSV", callback_data="export_csv")
+    )
+    return builder.as_markup()
+
 def conversation_keyboard(user_id):
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -1,10 +1,10 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
-from database import get_setting
+from database import get_cached_setting
 
 async def groups_keyboard():
-    training_link = await get_setting('training_group_link') or "https://t.me/+7crlJXEcRAk0YTUy"
-    chat_link = await get_setting('chat_group_link') or "https://t.me/+GnKecVUalic2OTBi"
+    training_link = get_cached_setting('training_group_link') or "https://t.me/+7crlJXEcRAk0YTUy"
+    chat_link = get_cached_setting('chat_group_link') or "https://t.me/+GnKecVUalic2OTBi"
     
     builder = InlineKeyboardBuilder()
     builder.row(
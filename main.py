@@ -3,10 +3,17 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import BOT_TOKEN
-from database import init_db, init_default_settings, init_default_faq, init_forbidden_topics
+from database import (
+    init_db, init_pool, close_pool, flush_writes,
+    init_default_settings, init_default_faq, init_forbidden_topics
+)
 from handlers import get_router
 from logging_config import setup_logging
 from utils.auto_hide import auto_hide_inactive_users
+from utils.materials_index import rebuild_materials_index
+from utils.ai_handler import get_forbidden_matcher
+from utils.answer_index import refresh_answer_index
+from utils.llm import close_llm
 
 logger = setup_logging()
 
@@ -14,9 +21,13 @@ async def main():
     logger.info("Starting bot initialization...")
     
     await init_db()
+    await init_pool()
     await init_default_settings()
     await init_default_faq()
     await init_forbidden_topics()
+    await rebuild_materials_index()
+    await get_forbidden_matcher()
+    await refresh_answer_index()
     
     logger.info("Database initialized")
     
@@ -31,8 +42,13 @@ async def main():
     
     logger.info("Bot configured, starting polling...")
     
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+    finally:
+        await flush_writes()
+        await close_llm()
+        await close_pool()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# config.py читает их при импорте
+for name, value in (('BOT_TOKEN', 'test'), ('ADMIN_ID', '1'), ('GROUP_ID', '2'), ('SMS_GROUP_ID', '3')):
+    os.environ.setdefault(name, value)
@@ -0,0 +1,91 @@
+import asyncio
+import importlib.util
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+# Модули грузятся по пути, чтобы не тянуть пакет database с aiosqlite
+DATABASE_DIR = Path(__file__).resolve().parent.parent / 'database'
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(name, DATABASE_DIR / f'{name}.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+migrations = _load('migrations')
+queries = _load('queries')
+
+class _Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __await__(self):
+        return self._ready().__await__()
+
+    async def _ready(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+class _Connection:
+    """Минимум API aiosqlite, нужный миграциям"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, params=()):
+        return _Cursor(self._conn.execute(sql, params))
+
+HOT_QUERIES = {
+    'get_messages': queries.RECENT_MESSAGES,
+    'get_user_conversations': queries.USER_CONVERSATION,
+    'has_bot_responded': queries.BOT_RESPONDED,
+    'get_photos': queries.USER_PHOTOS,
+    'get_faq_by_category': queries.FAQ_BY_CATEGORY,
+    'get_unprocessed_messages': queries.UNPROCESSED_GROUP_MESSAGES,
+    'auto_hide': queries.auto_hide_query(3),
+    'users_list_first_page': queries.users_list_query()[0],
+    'users_list_next_page': queries.users_list_query(after=('2024-01-01 00:00:00', 1))[0],
+    'users_list_previous_page': queries.users_list_query(before=('2024-01-01 00:00:00', 1))[0],
+}
+
+@pytest.fixture(scope='module')
+def db():
+    conn = sqlite3.connect(':memory:')
+    connection = _Connection(conn)
+
+    async def migrate():
+        for _, _, apply in migrations.MIGRATIONS:
+            await apply(connection)
+
+    asyncio.run(migrate())
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_query_uses_index(db, name):
+    sql = HOT_QUERIES[name]
+    plan = [row[3] for row in db.execute(f'EXPLAIN QUERY PLAN {sql}', (None,) * sql.count('?'))]
+
+    accesses = [step for step in plan if step.startswith(('SCAN', 'SEARCH'))]
+    assert accesses, plan
+    for step in accesses:
+        assert step.startswith('SEARCH'), f"{name} scans a table: {plan}"
+        assert 'INDEX' in step or 'PRIMARY KEY' in step, f"{name} searches without an index: {plan}"
+    assert not any('TEMP B-TREE' in step for step in plan), f"{name} sorts in a temp b-tree: {plan}"
+
+def test_every_planned_index_exists(db):
+    existing = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {name for name, _ in migrations.INDEXES} <= existing
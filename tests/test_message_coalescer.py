@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('dotenv')
+
+from utils import message_coalescer
+
+@pytest.fixture(autouse=True)
+def short_window(monkeypatch):
+    monkeypatch.setattr(message_coalescer, 'MESSAGE_COALESCE_WINDOW', 0.01)
+    message_coalescer._bursts.clear()
+
+async def _send_burst(user_id, *texts):
+    results = []
+    for text in texts:
+        results.append(asyncio.create_task(message_coalescer.collect_message(user_id, text)))
+        await asyncio.sleep(0)
+    return await asyncio.gather(*results)
+
+@pytest.mark.parametrize('greeting, question', [
+    ('привет', 'а когда выплаты приходят на карту?'),
+    ('hi', 'мне нужна помощь с выводом денег'),
+    ('Добрый день!', 'как взять выходной'),
+])
+def test_greeting_does_not_hide_question(greeting, question):
+    results = asyncio.run(_send_burst(1, greeting, question))
+
+    assert results[0] == (None, None)
+    merged, token = results[-1]
+    assert merged == question
+    assert token is not None
+
+def test_greeting_alone_is_kept():
+    (merged, _), = asyncio.run(_send_burst(1, 'привет'))
+    assert merged == 'привет'
+
+def test_burst_of_questions_is_merged_in_order():
+    results = asyncio.run(_send_burst(1, 'сколько платят', 'и когда выплаты'))
+    assert results[-1][0] == 'сколько платят\nи когда выплаты'
+
+def test_failed_handler_leaves_no_stale_burst():
+    async def scenario():
+        (question, token), = await _send_burst(1, 'первый вопрос')
+        # Обработчик упал до run_coalesced
+        message_coalescer.discard_burst(1, token)
+        return await _send_burst(1, 'через час')
+
+    (merged, _), = asyncio.run(scenario())
+    assert merged == 'через час'
+
+def test_discard_ignores_newer_burst():
+    async def scenario():
+        (_, old_token), = await _send_burst(1, 'старый')
+        message_coalescer._bursts.pop(1)
+        task = asyncio.create_task(message_coalescer.collect_message(1, 'новый'))
+        await asyncio.sleep(0)
+        message_coalescer.discard_burst(1, old_token)
+        return await task
+
+    merged, token = asyncio.run(scenario())
+    assert merged == 'новый'
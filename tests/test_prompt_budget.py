@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('dotenv')
+pytest.importorskip('aiosqlite')
+
+import config
+import database.pool
+from database import init_db, init_pool, close_pool, init_default_faq, create_user, save_message, flush_writes
+from utils import llm
+from utils import ai_handler
+from utils.prompt_budget import estimate_tokens
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'bot.db')
+    monkeypatch.setattr(config, 'DB_PATH', path)
+    monkeypatch.setattr(database.pool, 'DB_PATH', path)
+    return path
+
+def test_sent_messages_fit_the_token_budget(temp_db):
+    backend = llm.MockBackend()
+
+    async def scenario():
+        await init_db()
+        await init_pool()
+        try:
+            await init_default_faq()
+            await create_user(1, 'budget')
+            for i in range(20):
+                await save_message(1, 'user' if i % 2 else 'bot', f"сообщение {i} " + "очень длинный текст " * 150)
+            await flush_writes()
+
+            llm.set_backend(backend)
+            await ai_handler.get_ai_response(1, 'как запустить эфир и сколько платят за звонок', is_in_groups=True)
+        finally:
+            await close_pool()
+
+    asyncio.run(scenario())
+
+    messages, _ = backend.calls[0]
+    sent = sum(estimate_tokens(message['content']) for message in messages)
+    assert sent <= config.PROMPT_TOKEN_BUDGET
+    assert messages[0]['content'] == config.SYSTEM_PROMPT
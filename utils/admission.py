@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from config import LLM_MAX_CONCURRENT
+from utils.provider_scoreboard import percentile
+
+logger = logging.getLogger(__name__)
+
+# Меньшее значение проходит первым
+PRIORITY_REGISTRATION = 0
+PRIORITY_WORKING = 1
+PRIORITY_NEW = 2
+PRIORITY_BACKGROUND = 3
+
+STATUS_CATEGORY_PRIORITIES = {
+    'registration': PRIORITY_REGISTRATION,
+    'working': PRIORITY_WORKING,
+    'new': PRIORITY_NEW,
+}
+
+QUEUE_WAIT_WINDOW = 200
+
+class AdmissionTimeout(Exception):
+    pass
+
+class AdmissionController:
+    """Не больше limit запросов к LLM одновременно, остальные ждут в очереди по приоритету"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self.admitted = 0
+        self.timed_out = 0
+        self.waits = deque(maxlen=QUEUE_WAIT_WINDOW)
+
+    def queued(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority, max_wait=None):
+        started = time.monotonic()
+
+        if self.active < self.limit and not self.queued():
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._order), future))
+            try:
+                await asyncio.wait_for(future, timeout=max_wait)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                self.waits.append(time.monotonic() - started)
+                raise AdmissionTimeout(f"LLM queue wait exceeded {max_wait}s")
+            except asyncio.CancelledError:
+                # Слот могли передать перед самой отменой
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+
+        self.admitted += 1
+        self.waits.append(time.monotonic() - started)
+
+    def release(self):
+        # Слот сразу переходит лучшему из ждущих
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority, max_wait=None):
+        await self.acquire(priority, max_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        waits = list(self.waits)
+        return {
+            'active': self.active,
+            'limit': self.limit,
+            'queued': self.queued(),
+            'admitted': self.admitted,
+            'timed_out': self.timed_out,
+            'wait_p50': percentile(waits, 0.5),
+            'wait_p95': percentile(waits, 0.95),
+        }
+
+admission = AdmissionController(LLM_MAX_CONCURRENT)
+
+def priority_for_category(category):
+    return STATUS_CATEGORY_PRIORITIES.get(category, PRIORITY_NEW)
+
+def format_admission_stats(stats):
+    def seconds(value):
+        return f"{value:.1f}s" if value is not None else "—"
+
+    return (
+        f"В работе: {stats['active']}/{stats['limit']}, в очереди: {stats['queued']}\n"
+        f"Ожидание p50 / p95: {seconds(stats['wait_p50'])} / {seconds(stats['wait_p95'])}\n"
+        f"Пропущено: {stats['admitted']}, отказов по таймауту: {stats['timed_out']}"
+    )
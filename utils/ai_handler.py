@@ -2,25 +2,32 @@
 import json
 import asyncio
 import logging
+import random
 import re
-from g4f.client import Client
-from g4f.Provider import RetryProvider
-import g4f
 
-from config import SYSTEM_PROMPT, AI_CONFIDENCE_THRESHOLD, UNIVERSAL_RESPONSE
-from database import get_messages, get_faq, get_ai_learning, get_user, get_forbidden_topics_from_db
+from config import (
+    SYSTEM_PROMPT, AI_CONFIDENCE_THRESHOLD, UNIVERSAL_RESPONSE, LLM_MAX_QUEUE_WAIT, PROMPT_TOKEN_BUDGET,
+    LLM_STREAMING, AI_REQUEST_DEADLINE, AI_ATTEMPT_TIMEOUT, AI_MIN_ATTEMPT_TIME,
+    AI_RETRY_BASE_DELAY, AI_RETRY_MAX_DELAY, AI_BREAKER_WINDOW, AI_BREAKER_MIN_CALLS,
+    AI_BREAKER_FAILURE_RATE, AI_BREAKER_COOLDOWN
+)
+from utils.materials_index import search_materials
+from utils.answer_index import find_indexed_answer
+from utils import llm
+from utils.llm import is_g4f_error
+from utils.admission import AdmissionTimeout, priority_for_category
+from utils.circuit_breaker import CircuitBreaker
+from utils.keyword_matcher import KeywordMatcher
+from utils.prompt_budget import PromptBudget
+from utils.answer_cache import (
+    normalize_question, make_cache_key, cache_versions, get_cached_answer, store_cached_answer
+)
+from database import (
+    get_messages, get_faq, get_top_ai_learning, get_user, get_forbidden_topics_from_db, data_version
+)
 
 logger = logging.getLogger(__name__)
 
-all_providers = [
-    provider for provider in g4f.Provider.__providers__ 
-    if provider.working
-]
-
-client = Client(
-    provider=RetryProvider(all_providers, shuffle=True)
-)
-
 # ============ ПОЛНАЯ БАЗА ЗНАНИЙ ПО HALO ============
 
 HALO_TRAINING_KNOWLEDGE = {
@@ -506,24 +513,28 @@ def extract_dislike_numbers(text):
     
     return None, None
 
+DISLIKE_CALC_KEYWORDS = [
+    'порахуй', 'посчитай', 'подсчитай', 'calculate', 'мій коефіцієнт', 'мой коэффициент',
+    'my ratio', 'який коефіцієнт', 'какой коэффициент', 'what ratio', 'what is my ratio',
+    'допомогти вирахувати', 'помочь рассчитать', 'help calculate', 'can you calculate',
+    'можеш порахувати', 'можешь посчитать', 'можеш допомогти', 'можешь помочь',
+    'вирахувати', 'рассчитать', 'calculate for me', 'допомогти', 'помочь',
+    'это норма', 'це норма', 'is this normal', 'is it ok', 'це добре', 'это хорошо'
+]
+
+DISLIKE_WORDS = ['дизлайк', 'dislike', 'дизлайків', 'диз', 'дизов', 'дізів']
+LIKE_WORDS = ['лайк', 'like', 'лайків', 'лайков', 'лайка']
+
 async def check_dislike_calculation(question, user_lang='ru'):
     """Проверяет вопрос на расчет коэффициента дизлайков"""
     q_lower = question.lower()
+    matched = INTENT_MATCHER.match_groups(q_lower)
     
-    calc_keywords = [
-        'порахуй', 'посчитай', 'подсчитай', 'calculate', 'мій коефіцієнт', 'мой коэффициент',
-        'my ratio', 'який коефіцієнт', 'какой коэффициент', 'what ratio', 'what is my ratio',
-        'допомогти вирахувати', 'помочь рассчитать', 'help calculate', 'can you calculate',
-        'можеш порахувати', 'можешь посчитать', 'можеш допомогти', 'можешь помочь',
-        'вирахувати', 'рассчитать', 'calculate for me', 'допомогти', 'помочь',
-        'это норма', 'це норма', 'is this normal', 'is it ok', 'це добре', 'это хорошо'
-    ]
-    
-    is_calc_question = any(kw in q_lower for kw in calc_keywords)
+    is_calc_question = 'dislike_calc' in matched
     
     has_numbers = bool(re.search(r'\d+', question))
-    has_dislikes = any(kw in q_lower for kw in ['дизлайк', 'dislike', 'дизлайків', 'диз', 'дизов', 'дізів'])
-    has_likes = any(kw in q_lower for kw in ['лайк', 'like', 'лайків', 'лайков', 'лайка'])
+    has_dislikes = 'dislike_words' in matched
+    has_likes = 'like_words' in matched
     
     if is_calc_question or (has_dislikes and has_likes and has_numbers):
         dislikes, likes = extract_dislike_numbers(question)
@@ -654,6 +665,8 @@ def find_relevant_knowledge(question, user_lang='ru', is_in_groups=False):
     НЕ возвращаем рабочие знания - только про регистрацию и общие вопросы!
     """
     q_lower = question.lower()
+    found = INTENT_MATCHER.find_keywords(q_lower)
+    matched = INTENT_MATCHER.match_groups(q_lower)
     relevant = []
     matched_categories = set()
     
@@ -665,10 +678,10 @@ def find_relevant_knowledge(question, user_lang='ru', is_in_groups=False):
         
         # Проверяем только разрешенные категории
         for category in allowed_categories:
-            if category in KNOWLEDGE_KEYWORDS:
+            if f'knowledge:{category}' in matched:
                 keywords = KNOWLEDGE_KEYWORDS[category]
                 for keyword in keywords:
-                    if keyword in q_lower:
+                    if keyword in found:
                         knowledge = HALO_TRAINING_KNOWLEDGE.get(user_lang, HALO_TRAINING_KNOWLEDGE['ru'])
                         for key in knowledge:
                             if category in key:
@@ -692,11 +705,9 @@ def find_relevant_knowledge(question, user_lang='ru', is_in_groups=False):
         ]
         
         for category in work_categories:
-            if category in KNOWLEDGE_KEYWORDS:
-                keywords = KNOWLEDGE_KEYWORDS[category]
-                if any(keyword in q_lower for keyword in keywords):
-                    logger.warning(f"Work question from non-member blocked: {category}")
-                    return []
+            if f'knowledge:{category}' in matched:
+                logger.warning(f"Work question from non-member blocked: {category}")
+                return []
         
         return []
     
@@ -716,8 +727,11 @@ def find_relevant_knowledge(question, user_lang='ru', is_in_groups=False):
     ]
     
     for category, keywords in specific_checks:
+        if f'knowledge:{category}' not in matched:
+            continue
+        
         for keyword in keywords:
-            if keyword in q_lower:
+            if keyword in found:
                 knowledge = HALO_TRAINING_KNOWLEDGE.get(user_lang, HALO_TRAINING_KNOWLEDGE['ru'])
                 if category in knowledge:
                     relevant.append(knowledge[category])
@@ -735,8 +749,11 @@ def find_relevant_knowledge(question, user_lang='ru', is_in_groups=False):
         if category in matched_categories:
             continue
         
+        if f'knowledge:{category}' not in matched:
+            continue
+        
         for keyword in keywords:
-            if keyword in q_lower:
+            if keyword in found:
                 knowledge = HALO_TRAINING_KNOWLEDGE.get(user_lang, HALO_TRAINING_KNOWLEDGE['ru'])
                 for key, value in knowledge.items():
                     if category in key or keyword in key:
@@ -747,41 +764,6 @@ def find_relevant_knowledge(question, user_lang='ru', is_in_groups=False):
     return relevant
 
 
-def find_relevant_materials(question, materials, max_results=3):
-    """Находит наиболее релевантные материалы по вопросу"""
-    if not materials:
-        return []
-    
-    question_lower = question.lower()
-    scored_materials = []
-    
-    for material in materials:
-        content = material.get('text') or material.get('transcription', '')
-        if not content:
-            continue
-        
-        content_lower = content.lower()
-        score = 0
-        
-        question_words = [w for w in question_lower.split() if len(w) > 3]
-        
-        for word in question_words:
-            if word in content_lower:
-                score += content_lower.count(word) * 2
-        
-        for category, keywords in KNOWLEDGE_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in question_lower and keyword in content_lower:
-                    score += 10
-        
-        if score > 0:
-            scored_materials.append((score, material, content))
-    
-    scored_materials.sort(key=lambda x: x[0], reverse=True)
-    
-    return [(m, c) for _, m, c in scored_materials[:max_results]]
-
-
 COUNTRY_KEYWORDS = [
     'азербайджан', 'azerbaijan',
     'казахстан', 'kazakhstan',
@@ -843,132 +825,75 @@ COUNTRY_KEYWORDS = [
 ]
 
 def detect_country_in_text(text):
-    text_lower = text.lower()
-    for country in COUNTRY_KEYWORDS:
-        if country in text_lower:
-            return country
-    return None
+    return INTENT_MATCHER.first_keyword(text.lower(), 'country')
 
-def is_g4f_error(content):
-    if not content:
-        return True
-    c = content.lower()
-    if 'does not exist' in c:
-        return True
-    if 'the model does not' in c:
-        return True
-    if 'model' in c and 'exist' in c:
-        return True
-    if c.startswith('error'):
-        return True
-    if 'api.airforce' in c:
-        return True
-    if 'bad request' in c:
-        return True
-    if len(content.strip()) < 3:
-        return True
-    return False
+# Фильтр запрещённых тем, пересобирается при их изменении
+_forbidden_matcher = None
+_forbidden_version = None
+
+async def get_forbidden_matcher():
+    global _forbidden_matcher, _forbidden_version
+
+    version = data_version('forbidden')
+    if _forbidden_matcher is not None and _forbidden_version == version:
+        return _forbidden_matcher
 
-async def check_forbidden_topics(message):
-    msg_lower = message.lower()
     topics = await get_forbidden_topics_from_db()
-    
-    for topic in topics:
-        keywords = json.loads(topic['keywords'])
-        for keyword in keywords:
-            if keyword.lower() in msg_lower:
-                return True
-    return False
+    groups = {
+        topic['id']: [keyword.lower() for keyword in json.loads(topic['keywords'])]
+        for topic in topics
+    }
 
-async def build_context_prompt(user_id, question, is_in_groups=False):
-    from database.analysis import get_all_analysis_texts, get_all_analysis_audios, get_all_analysis_videos
-    
-    user = await get_user(user_id)
-    history = await get_messages(user_id, limit=15)
-    
-    user_lang = user['language'] if user and user['language'] else 'ru'
-    
-    relevant_knowledge = find_relevant_knowledge(question, user_lang, is_in_groups)
-    
-    status = user['status']
+    # Изменение во время чтения оставит старую версию - пересоберём в следующий раз
+    _forbidden_matcher = KeywordMatcher(groups)
+    _forbidden_version = version
+    logger.info(f"Forbidden topics filter built: {len(groups)} topics")
+    return _forbidden_matcher
+
+async def check_forbidden_topics(message):
+    matcher = await get_forbidden_matcher()
+    return bool(matcher.match_groups(message.lower()))
+
+# Готовые части промпта по (lang, category, in_groups)
+_faq_blocks = {}
+_prompt_sections = {}
+
+LANG_NAMES = {'ru': 'РУССКОМ', 'uk': 'УКРАЇНСЬКОЮ', 'en': 'ENGLISH'}
+
+LANG_REMINDERS = {
+    'ru': '⚠️ ЯЗЫК ОТВЕТА: ТОЛЬКО РУССКИЙ! Никаких других языков!',
+    'uk': '⚠️ МОВА ВІДПОВІДІ: ТІЛЬКИ УКРАЇНСЬКА! Жодних інших мов!',
+    'en': '⚠️ RESPONSE LANGUAGE: ONLY ENGLISH! No other languages!'
+}
+
+def get_status_category(status):
     if status in ['new', 'chatting', 'waiting_photos', 'asking_work_hours', 'asking_experience']:
-        category = 'new'
+        return 'new'
     elif status in ['helping_registration', 'waiting_screenshot']:
-        category = 'registration'
+        return 'registration'
     elif status in ['registered', 'approved']:
-        category = 'working'
-    else:
-        category = 'new'
+        return 'working'
+    return 'new'
+
+async def _get_faq_items(category):
+    version = data_version('faq')
+    cached = _faq_blocks.get(category)
+    if cached and cached[0] == version:
+        return cached[1]
     
     faq_ru = await get_faq(category=category)
     faq_all = await get_faq()
-    learning = await get_ai_learning()
-    
-    history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
     
-    faq_text = "\n".join([f"Q: {f['question']}\nA: {f['answer']}" for f in faq_ru[:30]])
-    faq_text += "\n\n=== ДОПОЛНИТЕЛЬНЫЕ ВОПРОСЫ (ВСЕ ЯЗЫКИ) ===\n"
-    faq_text += "\n".join([f"Q: {f['question']}\nA: {f['answer']}" for f in faq_all[:50]])
+    faq_items = (
+        [f"Q: {f['question']}\nA: {f['answer']}" for f in faq_ru[:30]],
+        [f"Q: {f['question']}\nA: {f['answer']}" for f in faq_all[:50]]
+    )
     
-    learning_text = "\n".join([f"Q: {l['question']}\nA: {l['answer']} (confidence: {l['confidence']})" for l in learning[:10]])
-    
-    if is_in_groups:
-        group_status = "✅ ЕСТЬ В ГРУППАХ - можешь отвечать на ВСЕ рабочие вопросы"
-    else:
-        group_status = "❌ НЕТ В ГРУППАХ - отвечай ТОЛЬКО на вопросы о РЕГИСТРАЦИИ и ЗАРАБОТКЕ"
-    
-    last_messages = history[-5:] if len(history) >= 5 else history
-    recent_context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in last_messages])
-    
-    knowledge_section = ""
-    if relevant_knowledge:
-        knowledge_section = f"\n\n=== СПЕЦИАЛЬНЫЕ ЗНАНИЯ ПО ВОПРОСУ ===\n"
-        knowledge_section += "\n\n".join(relevant_knowledge[:5])
-        knowledge_section += "\n⚠️ ИСПОЛЬЗУЙ ЭТИ ЗНАНИЯ ДЛЯ ОТВЕТА!\n"
-    
-    training_materials = ""
-    
-    if is_in_groups:
-        texts_all = await get_all_analysis_texts(lang=user_lang)
-        audios_all = await get_all_analysis_audios(lang=user_lang)
-        videos_all = await get_all_analysis_videos(lang=user_lang)
-        
-        relevant_texts = find_relevant_materials(question, texts_all, max_results=5)
-        relevant_audios = find_relevant_materials(question, audios_all, max_results=3)
-        relevant_videos = find_relevant_materials(question, videos_all, max_results=3)
-        
-        if relevant_texts or relevant_audios or relevant_videos:
-            training_materials = f"\n\n=== РЕЛЕВАНТНЫЕ ОБУЧАЮЩИЕ МАТЕРИАЛЫ (доступны т.к. пользователь В ГРУППАХ) ===\n"
-            training_materials += "⚠️ ЭТИ МАТЕРИАЛЫ СПЕЦИАЛЬНО ОТОБРАНЫ ПО ТВОЕМУ ВОПРОСУ - ИСПОЛЬЗУЙ ИХ!\n\n"
-            
-            if relevant_texts:
-                training_materials += "=== РЕЛЕВАНТНЫЕ ТЕКСТОВЫЕ ИНСТРУКЦИИ ===\n"
-                for i, (text, content) in enumerate(relevant_texts, 1):
-                    training_materials += f"\n--- Документ {i} (РЕЛЕВАНТНЫЙ) ---\n{content[:2000]}\n"
-            
-            if relevant_audios:
-                training_materials += "\n=== РЕЛЕВАНТНЫЕ АУДИО МАТЕРИАЛЫ ===\n"
-                for i, (audio, content) in enumerate(relevant_audios, 1):
-                    training_materials += f"\n--- Аудио {i} (РЕЛЕВАНТНЫЙ) ---\n{content[:1500]}\n"
-            
-            if relevant_videos:
-                training_materials += "\n=== РЕЛЕВАНТНЫЕ ВИДЕО МАТЕРИАЛЫ ===\n"
-                for i, (video, content) in enumerate(relevant_videos, 1):
-                    training_materials += f"\n--- Видео {i} (РЕЛЕВАНТНЫЙ) ---\n{content[:1500]}\n"
-    
-    lang_names = {'ru': 'РУССКОМ', 'uk': 'УКРАЇНСЬКОЮ', 'en': 'ENGLISH'}
-    lang_name = lang_names.get(user_lang, 'РУССКОМ')
-    
-    lang_reminders = {
-        'ru': '⚠️ ЯЗЫК ОТВЕТА: ТОЛЬКО РУССКИЙ! Никаких других языков!',
-        'uk': '⚠️ МОВА ВІДПОВІДІ: ТІЛЬКИ УКРАЇНСЬКА! Жодних інших мов!',
-        'en': '⚠️ RESPONSE LANGUAGE: ONLY ENGLISH! No other languages!'
-    }
-    lang_reminder = lang_reminders.get(user_lang, lang_reminders['ru'])
-    
-    not_in_groups_warning = ""
-    if not is_in_groups:
-        not_in_groups_warning = f"""
+    _faq_blocks[category] = (version, faq_items)
+    return faq_items
+
+def _build_not_in_groups_warning(user_lang):
+    return f"""
 🔴🔴🔴 КРИТИЧЕСКИ ВАЖНО 🔴🔴🔴
 ПОЛЬЗОВАТЕЛЬ НЕ В ГРУППАХ!
 ТЫ МОЖЕШЬ ОТВЕЧАТЬ ТОЛЬКО НА ВОПРОСЫ О:
@@ -989,9 +914,53 @@ async def build_context_prompt(user_id, question, is_in_groups=False):
 ЭСКАЛИРУЙ (escalate: true) на любые рабочие вопросы!
 🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴
 """
+
+async def get_prompt_sections(user_lang, category, is_in_groups):
+    versions = (data_version('faq'), data_version('ai_learning'))
+    key = (user_lang, category, is_in_groups)
+    cached = _prompt_sections.get(key)
+    if cached and cached[0] == versions:
+        return cached[1]
+    
+    faq_items = await _get_faq_items(category)
+    learning = await get_top_ai_learning()
+    learning_items = [f"Q: {l['question']}\nA: {l['answer']} (confidence: {l['confidence']})" for l in learning]
     
-    context_prompt = f"""
-СТАТУС ПОЛЬЗОВАТЕЛЯ: {user['status']}
+    if is_in_groups:
+        group_status = "✅ ЕСТЬ В ГРУППАХ - можешь отвечать на ВСЕ рабочие вопросы"
+    else:
+        group_status = "❌ НЕТ В ГРУППАХ - отвечай ТОЛЬКО на вопросы о РЕГИСТРАЦИИ и ЗАРАБОТКЕ"
+    
+    sections = {
+        'faq_items': faq_items,
+        'learning_items': learning_items,
+        'group_status': group_status,
+        'not_in_groups_warning': "" if is_in_groups else _build_not_in_groups_warning(user_lang),
+        'lang_name': LANG_NAMES.get(user_lang, 'РУССКОМ'),
+        'lang_reminder': LANG_REMINDERS.get(user_lang, LANG_REMINDERS['ru']),
+    }
+    
+    _prompt_sections[key] = (versions, sections)
+    return sections
+
+MATERIALS_HEADER = (
+    "\n\n=== РЕЛЕВАНТНЫЕ ОБУЧАЮЩИЕ МАТЕРИАЛЫ (доступны т.к. пользователь В ГРУППАХ) ===\n"
+    "⚠️ ЭТИ МАТЕРИАЛЫ СПЕЦИАЛЬНО ОТОБРАНЫ ПО ТВОЕМУ ВОПРОСУ - ИСПОЛЬЗУЙ ИХ!\n\n"
+)
+
+# (тип, макс. документов, символов на документ, заголовок, подпись)
+MATERIAL_SECTIONS = [
+    ('text', 5, 2000, "=== РЕЛЕВАНТНЫЕ ТЕКСТОВЫЕ ИНСТРУКЦИИ ===\n", "Документ"),
+    ('audio', 3, 1500, "\n=== РЕЛЕВАНТНЫЕ АУДИО МАТЕРИАЛЫ ===\n", "Аудио"),
+    ('video', 3, 1500, "\n=== РЕЛЕВАНТНЫЕ ВИДЕО МАТЕРИАЛЫ ===\n", "Видео"),
+]
+
+KNOWLEDGE_HEADER = "\n\n=== СПЕЦИАЛЬНЫЕ ЗНАНИЯ ПО ВОПРОСУ ===\n"
+KNOWLEDGE_FOOTER = "\n⚠️ ИСПОЛЬЗУЙ ЭТИ ЗНАНИЯ ДЛЯ ОТВЕТА!\n"
+FAQ_EXTRA_HEADER = "\n\n=== ДОПОЛНИТЕЛЬНЫЕ ВОПРОСЫ (ВСЕ ЯЗЫКИ) ===\n"
+
+CONTEXT_PROMPT_TEMPLATE = """
+СТАТУС ПОЛЬЗОВАТЕЛЯ: {status}
 СТАТУС УЧАСТИЯ: {group_status}
 {not_in_groups_warning}
 
@@ -1050,8 +1019,95 @@ async def build_context_prompt(user_id, question, is_in_groups=False):
 
 🔴 ПОСЛЕДНЕЕ НАПОМИНАНИЕ: Ответ должен быть ПОЛНОСТЬЮ на языке {lang_name}!
 """
+
+def _fit_training_materials(budget, user_lang, question):
+    found = [
+        (header, label, chars, search_materials(user_lang, kind, question, max_results=max_results))
+        for kind, max_results, chars, header, label in MATERIAL_SECTIONS
+    ]
+    if not any(materials for *_, materials in found):
+        return ""
+    
+    training_materials = budget.take('materials', MATERIALS_HEADER)
+    has_documents = False
+    
+    for header, label, chars, materials in found:
+        if not materials:
+            continue
+        blocks = [
+            f"\n--- {label} {i} (РЕЛЕВАНТНЫЙ) ---\n{content[:chars]}\n"
+            for i, (material, content) in enumerate(materials, 1)
+        ]
+        kept = budget.fit('materials', blocks, separator='', overhead=header)
+        if kept:
+            training_materials += header + "".join(kept)
+            has_documents = True
+    
+    return training_materials if has_documents else ""
+
+async def build_context_prompt(user_id, question, is_in_groups=False, context=None):
+    if context is None:
+        context = await build_request_context(user_id, question, is_in_groups)
+    
+    user = context.user
+    history = context.history
+    user_lang = context.lang
+    
+    relevant_knowledge = find_relevant_knowledge(question, user_lang, is_in_groups)
+    
+    category = context.category
+    sections = await get_prompt_sections(user_lang, category, is_in_groups)
+    
+    fields = {
+        'status': user['status'],
+        'group_status': sections['group_status'],
+        'not_in_groups_warning': sections['not_in_groups_warning'],
+        'lang_name': sections['lang_name'],
+        'lang_reminder': sections['lang_reminder'],
+        'recent_context': "",
+        'knowledge_section': "",
+        'faq_text': "",
+        'training_materials': "",
+        'history_text': "",
+        'learning_text': "",
+        'question': "",
+    }
+    
+    # Секции заполняются по важности, пока хватает бюджета
+    # Бюджет общий на оба сообщения, системный промпт уходит с каждым вызовом
+    budget = PromptBudget(PROMPT_TOKEN_BUDGET)
+    budget.take('system', SYSTEM_PROMPT)
+    budget.take('template', CONTEXT_PROMPT_TEMPLATE.format(**fields))
+    fields['question'] = budget.take('question', question)
+    
+    last_messages = history[-5:] if len(history) >= 5 else history
+    recent = budget.fit('recent', [f"{msg['role']}: {msg['content']}" for msg in last_messages], keep_last=True)
+    fields['recent_context'] = "\n".join(recent)
+    
+    if relevant_knowledge:
+        knowledge = budget.fit(
+            'knowledge', relevant_knowledge[:5], separator="\n\n",
+            overhead=KNOWLEDGE_HEADER + KNOWLEDGE_FOOTER
+        )
+        if knowledge:
+            fields['knowledge_section'] = KNOWLEDGE_HEADER + "\n\n".join(knowledge) + KNOWLEDGE_FOOTER
+    
+    if is_in_groups:
+        fields['training_materials'] = _fit_training_materials(budget, user_lang, question)
+    
+    faq_ru, faq_all = sections['faq_items']
+    faq_ru = budget.fit('faq', faq_ru)
+    faq_all = budget.fit('faq', faq_all, overhead=FAQ_EXTRA_HEADER)
+    fields['faq_text'] = "\n".join(faq_ru) + (FAQ_EXTRA_HEADER + "\n".join(faq_all) if faq_all else "")
+    
+    fields['learning_text'] = "\n".join(budget.fit('learning', sections['learning_items']))
+    
+    history_lines = budget.fit('history', [f"{msg['role']}: {msg['content']}" for msg in history], keep_last=True)
+    fields['history_text'] = "\n".join(history_lines)
     
-    return context_prompt
+    budget.log_sizes(user_id)
+    
+    return CONTEXT_PROMPT_TEMPLATE.format(**fields)
 
 def get_not_in_groups_message(user_lang='ru'):
     """Возвращает сообщение для пользователей не в группах на их языке"""
@@ -1062,32 +1118,142 @@ def get_not_in_groups_message(user_lang='ru'):
     }
     return messages.get(user_lang, messages['ru'])
 
+LAUNCH_STREAM_KEYWORDS = {
+    'ru': ['как запустить эфир', 'как запустить трансляцию', 'запустить стрим', 'начать эфир'],
+    'uk': ['як запустити ефір', 'як запустити трансляцію', 'запустити стрім', 'почати ефір'],
+    'en': ['how to start stream', 'how to launch stream', 'start streaming', 'begin stream']
+}
+
+EARNINGS_KEYWORDS = {
+    'ru': ['сколько зарабатывают', 'сколько можно заработать', 'какой заработок'],
+    'uk': ['скільки заробляють', 'скільки можна заробити', 'який заробіток'],
+    'en': ['how much earn', 'how much can i earn', 'what are earnings']
+}
+
+AGENCY_KEYWORDS = [
+    'which agency', 'what agency', 'agency name', 'which one',
+    'яке агентство', 'какое агентство', 'назва агентства', 'название агентства',
+    'яке обрати', 'какое выбрать', 'which to choose', 'which should i choose',
+    'tosagency', 'агентств', 'agency', 'агентство', 'агенство',
+    'яке', 'какое', 'which', 'what is agency', 'what agency name'
+]
+
+AGENCY_WORDS = ['agency', 'агентств', 'агентство', 'агенство', 'яке', 'какое', 'which']
+
+VIDEO_PHOTO_KEYWORDS = [
+    'can i send video', 'video instead', 'відео замість', 'видео вместо',
+    'можу відео', 'могу видео', 'відправити відео', 'отправить видео'
+]
+
+DETAILED_KEYWORDS = [
+    'подробнее', 'больше информации', 'расскажи подробнее', 
+    'детальніше', 'більше інформації', 'розкажи детальніше', 
+    'more details', 'more information', 'tell me more'
+]
+
+WAITING_KEYWORDS = [
+    'просто ждать', 'мне просто ждать', 'мне ждать', 'просто жду', 'и все', 'теперь жду', 
+    'просто чекати', 'мені чекати', 'просто чекаю', 'і все', 'тепер чекаю',
+    'just wait', 'should i wait', 'wait now'
+]
+
+FAQ_DIRECT_ANSWERS = {
+    'привет': ('Привет! Чем могу помочь? 😊', 'Привіт! Чим можу допомогти? 😊', 'Hi! How can I help? 😊'),
+    'здравствуй': ('Здравствуй! Рада тебя видеть! Есть вопросы? 😊', 'Вітаю! Рада тебе бачити! Є питання? 😊', 'Hello! Nice to see you! Any questions? 😊'),
+    'вітаю': ('Вітаю! Чим можу допомогти? 😊', 'Вітаю! Чим можу допомогти? 😊', 'Hi! How can I help? 😊'),
+    'привіт': ('Привіт! Є питання? 😊', 'Привіт! Є питання? 😊', 'Hi! Any questions? 😊'),
+    'як дела': ('Чудово! А у тебя як? 😊', 'Чудово! А у тебе як? 😊', 'Great! How are you? 😊'),
+    'как дела': ('Отлично! У тебя как? 😊', 'Чудово! А у тебе як? 😊', 'Great! How are you? 😊'),
+    'кто ты': ('Я менеджер агентства Valencia, помогаю девочкам начать работу в Halo 😊', 'Я менеджер агентства Valencia, допомагаю дівчатам почати роботу в Halo 😊', "I'm a Valencia agency manager, helping girls start working in Halo 😊"),
+    'спасибо': ('Пожалуйста! 😊', 'Будь ласка! 😊', "You're welcome! 😊"),
+    'дякую': ('Будь ласка! 😊', 'Будь ласка! 😊', "You're welcome! 😊"),
+    'thanks': ('Пожалуйста! 😊', 'Будь ласка! 😊', "You're welcome! 😊"),
+    'hi': ('Hi! How can I help? 😊', 'Привіт! Чим можу допомогти? 😊', 'Hi! How can I help? 😊'),
+    'hello': ('Hello! How can I help? 😊', 'Привіт! Чим можу допомогти? 😊', 'Hello! How can I help? 😊')
+}
+
+WHAT_TO_DO_VARIANTS = [
+    # Русский
+    'що мені робити', 'что мне делать', 'що робити', 'что делать',
+    'що мені', 'что мне', 'що далі', 'что дальше', 
+    'що тепер', 'что теперь', 'що зараз', 'что сейчас',
+    'что нужно делать', 'що потрібно робити', 'що потрібно зробити',
+    'что нужно сделать', 'що треба робити', 'что надо делать',
+    
+    # Українська
+    'що мені робити зараз', 'що робити далі', 'що робити тепер',
+    'що треба зробити', 'що потрібно',
+    
+    # English
+    'what should i do', 'what now', 'what next', 'what to do', 'what i need to do',
+    'what do i need', 'what should i', 'what to do next', 'what do i do',
+    
+    # Короткие варианты
+    'і що', 'и что', 'а що', 'а what', 'а тепер', 'а теперь',
+    'okay, what', 'ok, what', 'so what', 'okay what', 'and what',
+    'що ж', 'что ж', 'ну що', 'ну что', 'і що далі', 'и что дальше'
+]
+
+PHOTO_REQUEST_KEYWORDS = [
+    'send 2-3 photos', 'send 2–3 photos', 'пришли 2-3 фото', 'пришли 2–3 фото',
+    'надішли 2-3 фото', 'надішли 2–3 фото', 'waiting for photos', 'жду фото', 'чекаю фото',
+    'how to start', 'як почати', 'как начать', 'if the format suits',
+    'пришли мне фото', 'надішли мені фото', 'send me photos'
+]
+
+INSTRUCTIONS_KEYWORDS = [
+    'інструкц', 'инструкц', 'instruction',
+    'реєстр', 'регистр', 'registr',
+    'надішли', 'пришли', 'send',
+    'скрин', 'screenshot',
+    'активуют', 'активують', 'activate',
+    'офіс', 'офис', 'office',
+    'тестовий період', 'тестовый період',
+    'заробити', 'заработать'
+]
+
+PHOTO_ONLY_FOR_KEYWORDS = ['тільки для', 'только для', 'only for']
+
+# Все наборы ключевых слов вопроса в одном matcher: один проход по тексту на вопрос
+INTENT_MATCHER = KeywordMatcher({
+    **{f'knowledge:{category}': keywords for category, keywords in KNOWLEDGE_KEYWORDS.items()},
+    'country': COUNTRY_KEYWORDS,
+    'dislike_calc': DISLIKE_CALC_KEYWORDS,
+    'dislike_words': DISLIKE_WORDS,
+    'like_words': LIKE_WORDS,
+    'launch_stream': [kw for keywords in LAUNCH_STREAM_KEYWORDS.values() for kw in keywords],
+    'earnings_direct': [kw for keywords in EARNINGS_KEYWORDS.values() for kw in keywords],
+    'agency': AGENCY_KEYWORDS,
+    'agency_words': AGENCY_WORDS,
+    'video_photo': VIDEO_PHOTO_KEYWORDS,
+    'faq_direct': list(FAQ_DIRECT_ANSWERS),
+    'detailed': DETAILED_KEYWORDS,
+    'waiting': WAITING_KEYWORDS,
+    'what_to_do': WHAT_TO_DO_VARIANTS,
+})
+
+BOT_MESSAGE_MATCHER = KeywordMatcher({
+    'photo_request': PHOTO_REQUEST_KEYWORDS,
+    'instructions': INSTRUCTIONS_KEYWORDS,
+    'photo': ['фото'],
+    'only_for': PHOTO_ONLY_FOR_KEYWORDS,
+    'screenshot_or_office': ['скрин', 'screenshot', 'офіс', 'офис'],
+})
+
 async def check_faq_direct_match(question, user_lang='ru'):
     q_lower = question.lower().strip()
+    found = INTENT_MATCHER.find_keywords(q_lower)
+    matched = INTENT_MATCHER.match_groups(q_lower)
     
     # ===== НОВАЯ ПРОВЕРКА: Прямые ответы на популярные вопросы =====
     
     # 1. КАК ЗАПУСТИТЬ ЭФИР
-    launch_stream_keywords = {
-        'ru': ['как запустить эфир', 'как запустить трансляцию', 'запустить стрим', 'начать эфир'],
-        'uk': ['як запустити ефір', 'як запустити трансляцію', 'запустити стрім', 'почати ефір'],
-        'en': ['how to start stream', 'how to launch stream', 'start streaming', 'begin stream']
-    }
-    
-    for lang, keywords in launch_stream_keywords.items():
-        if any(kw in q_lower for kw in keywords):
-            return HALO_TRAINING_KNOWLEDGE.get(user_lang, HALO_TRAINING_KNOWLEDGE['ru']).get('live_stream_start')
+    if 'launch_stream' in matched:
+        return HALO_TRAINING_KNOWLEDGE.get(user_lang, HALO_TRAINING_KNOWLEDGE['ru']).get('live_stream_start')
     
     # 2. ЗАРАБОТКИ
-    earnings_keywords = {
-        'ru': ['сколько зарабатывают', 'сколько можно заработать', 'какой заработок'],
-        'uk': ['скільки заробляють', 'скільки можна заробити', 'який заробіток'],
-        'en': ['how much earn', 'how much can i earn', 'what are earnings']
-    }
-    
-    for lang, keywords in earnings_keywords.items():
-        if any(kw in q_lower for kw in keywords):
-            return HALO_TRAINING_KNOWLEDGE.get(user_lang, HALO_TRAINING_KNOWLEDGE['ru']).get('earnings_info')
+    if 'earnings_direct' in matched:
+        return HALO_TRAINING_KNOWLEDGE.get(user_lang, HALO_TRAINING_KNOWLEDGE['ru']).get('earnings_info')
     
     # ===== СТАРЫЕ ПРОВЕРКИ =====
     
@@ -1095,22 +1261,10 @@ async def check_faq_direct_match(question, user_lang='ru'):
     if relevant_knowledge and len(q_lower.split()) <= 15:
         return relevant_knowledge[0]
     
-    agency_keywords = [
-        'which agency', 'what agency', 'agency name', 'which one',
-        'яке агентство', 'какое агентство', 'назва агентства', 'название агентства',
-        'яке обрати', 'какое выбрать', 'which to choose', 'which should i choose',
-        'tosagency', 'агентств', 'agency', 'агентство', 'агенство',
-        'яке', 'какое', 'which', 'what is agency', 'what agency name'
-    ]
-    
-    is_agency_question = False
-    for kw in agency_keywords:
-        if kw in q_lower:
-            is_agency_question = True
-            break
+    is_agency_question = 'agency' in matched
     
     if not is_agency_question:
-        agency_words_count = sum(1 for word in ['agency', 'агентств', 'агентство', 'агенство', 'яке', 'какое', 'which'] if word in q_lower)
+        agency_words_count = sum(1 for word in AGENCY_WORDS if word in found)
         if agency_words_count > 0 and len(q_lower.split()) <= 4:
             is_agency_question = True
     
@@ -1122,12 +1276,7 @@ async def check_faq_direct_match(question, user_lang='ru'):
         }
         return responses.get(user_lang, responses['ru'])
     
-    video_photo_keywords = [
-        'can i send video', 'video instead', 'відео замість', 'видео вместо',
-        'можу відео', 'могу видео', 'відправити відео', 'отправить видео'
-    ]
-    
-    if any(kw in q_lower for kw in video_photo_keywords):
+    if 'video_photo' in matched:
         responses = {
             'ru': 'Нужны именно фото, не видео 📸 Пришли 2-3 фото хорошего качества, чтобы было чётко видно лицо 😊',
             'uk': 'Потрібні саме фото, не відео 📸 Надішли 2-3 фото хорошої якості, щоб було чітко видно обличчя 😊',
@@ -1135,7 +1284,7 @@ async def check_faq_direct_match(question, user_lang='ru'):
         }
         return responses.get(user_lang, responses['ru'])
     
-    country = detect_country_in_text(q_lower)
+    country = INTENT_MATCHER.first_keyword(q_lower, 'country')
     if country:
         country_display = country.capitalize()
         responses = {
@@ -1329,47 +1478,20 @@ If the format suits — waiting for photos 👋"""
         'cool': ('😊', '😊', '😊')
     }
     
-    for reaction, responses in simple_reactions.items():
-        if q_lower == reaction:
-            lang_index = {'ru': 0, 'uk': 1, 'en': 2}.get(user_lang, 0)
-            return responses[lang_index]
-    
-    faq_direct = {
-        'привет': ('Привет! Чем могу помочь? 😊', 'Привіт! Чим можу допомогти? 😊', 'Hi! How can I help? 😊'),
-        'здравствуй': ('Здравствуй! Рада тебя видеть! Есть вопросы? 😊', 'Вітаю! Рада тебе бачити! Є питання? 😊', 'Hello! Nice to see you! Any questions? 😊'),
-        'вітаю': ('Вітаю! Чим можу допомогти? 😊', 'Вітаю! Чим можу допомогти? 😊', 'Hi! How can I help? 😊'),
-        'привіт': ('Привіт! Є питання? 😊', 'Привіт! Є питання? 😊', 'Hi! Any questions? 😊'),
-        'як дела': ('Чудово! А у тебя як? 😊', 'Чудово! А у тебе як? 😊', 'Great! How are you? 😊'),
-        'как дела': ('Отлично! У тебя как? 😊', 'Чудово! А у тебе як? 😊', 'Great! How are you? 😊'),
-        'кто ты': ('Я менеджер агентства Valencia, помогаю девочкам начать работу в Halo 😊', 'Я менеджер агентства Valencia, допомагаю дівчатам почати роботу в Halo 😊', "I'm a Valencia agency manager, helping girls start working in Halo 😊"),
-        'спасибо': ('Пожалуйста! 😊', 'Будь ласка! 😊', "You're welcome! 😊"),
-        'дякую': ('Будь ласка! 😊', 'Будь ласка! 😊', "You're welcome! 😊"),
-        'thanks': ('Пожалуйста! 😊', 'Будь ласка! 😊', "You're welcome! 😊"),
-        'hi': ('Hi! How can I help? 😊', 'Привіт! Чим можу допомогти? 😊', 'Hi! How can I help? 😊'),
-        'hello': ('Hello! How can I help? 😊', 'Привіт! Чим можу допомогти? 😊', 'Hello! How can I help? 😊')
-    }
+    responses = simple_reactions.get(q_lower)
+    if responses:
+        lang_index = {'ru': 0, 'uk': 1, 'en': 2}.get(user_lang, 0)
+        return responses[lang_index]
     
-    for key, answers in faq_direct.items():
-        if key in q_lower or q_lower in key:
+    for key, answers in FAQ_DIRECT_ANSWERS.items():
+        if key in found or q_lower in key:
             lang_index = {'ru': 0, 'uk': 1, 'en': 2}.get(user_lang, 0)
             return answers[lang_index]
     
-    detailed_keywords = [
-        'подробнее', 'больше информации', 'расскажи подробнее', 
-        'детальніше', 'більше інформації', 'розкажи детальніше', 
-        'more details', 'more information', 'tell me more'
-    ]
-    
-    if any(kw in q_lower for kw in detailed_keywords):
+    if 'detailed' in matched:
         return detailed_info.get(user_lang, detailed_info['ru'])
     
-    waiting_keywords = [
-        'просто ждать', 'мне просто ждать', 'мне ждать', 'просто жду', 'и все', 'теперь жду', 
-        'просто чекати', 'мені чекати', 'просто чекаю', 'і все', 'тепер чекаю',
-        'just wait', 'should i wait', 'wait now'
-    ]
-    
-    if any(kw in q_lower for kw in waiting_keywords):
+    if 'waiting' in matched:
         responses = {
             'ru': 'Да, просто жди 😊 Активация обычно происходит на следующий будний день. Как только активируют — сможешь начать зарабатывать! 💪',
             'uk': 'Так, просто чекай 😊 Активація зазвичай відбувається наступного робочого дня. Як тільки активують — зможеш почати заробляти! 💪',
@@ -1379,33 +1501,10 @@ If the format suits — waiting for photos 👋"""
     
     return None
 
-async def is_contextual_question(question, history):
+async def is_contextual_question(question, history, user=None):
     q_lower = question.lower().strip()
     
-    # РАСШИРЕННЫЙ список вариантов "что делать"
-    what_to_do_variants = [
-        # Русский
-        'що мені робити', 'что мне делать', 'що робити', 'что делать',
-        'що мені', 'что мне', 'що далі', 'что дальше', 
-        'що тепер', 'что теперь', 'що зараз', 'что сейчас',
-        'что нужно делать', 'що потрібно робити', 'що потрібно зробити',
-        'что нужно сделать', 'що треба робити', 'что надо делать',
-        
-        # Українська
-        'що мені робити зараз', 'що робити далі', 'що робити тепер',
-        'що треба зробити', 'що потрібно',
-        
-        # English
-        'what should i do', 'what now', 'what next', 'what to do', 'what i need to do',
-        'what do i need', 'what should i', 'what to do next', 'what do i do',
-        
-        # Короткие варианты
-        'і що', 'и что', 'а що', 'а what', 'а тепер', 'а теперь',
-        'okay, what', 'ok, what', 'so what', 'okay what', 'and what',
-        'що ж', 'что ж', 'ну що', 'ну что', 'і що далі', 'и что дальше'
-    ]
-    
-    if not any(variant in q_lower for variant in what_to_do_variants):
+    if 'what_to_do' not in INTENT_MATCHER.match_groups(q_lower):
         return None
     
     if not history or len(history) < 2:
@@ -1421,44 +1520,29 @@ async def is_contextual_question(question, history):
     if not last_bot_messages:
         return None
     
-    photo_request_keywords = [
-        'send 2-3 photos', 'send 2–3 photos', 'пришли 2-3 фото', 'пришли 2–3 фото',
-        'надішли 2-3 фото', 'надішли 2–3 фото', 'waiting for photos', 'жду фото', 'чекаю фото',
-        'how to start', 'як почати', 'как начать', 'if the format suits',
-        'пришли мне фото', 'надішли мені фото', 'send me photos'
-    ]
-    
-    instructions_keywords = [
-        'інструкц', 'инструкц', 'instruction',
-        'реєстр', 'регистр', 'registr',
-        'надішли', 'пришли', 'send',
-        'скрин', 'screenshot',
-        'активуют', 'активують', 'activate',
-        'офіс', 'офис', 'office',
-        'тестовий період', 'тестовый період',
-        'заробити', 'заработать'
-    ]
-    
-    user = await get_user(history[0]['user_id']) if history else None
+    if user is None:
+        user = await get_user(history[0]['user_id']) if history else None
     user_lang = user['language'] if user else 'ru'
     
     for bot_msg in last_bot_messages:
-        if any(kw in bot_msg for kw in photo_request_keywords):
+        bot_matched = BOT_MESSAGE_MATCHER.match_groups(bot_msg)
+        
+        if 'photo_request' in bot_matched:
             return {
                 'ru': 'Пришли мне 2-3 своих фото (хорошего качества, чтобы было чётко видно лицо) 📸',
                 'uk': 'Надішли мені 2-3 свої фото (хорошої якості, щоб було чітко видно обличчя) 📸',
                 'en': 'Send me 2-3 photos of yourself (good quality, face clearly visible) 📸'
             }.get(user_lang, 'Пришли мне 2-3 своих фото (хорошего качества, чтобы было чётко видно лицо) 📸')
         
-        if 'фото' in bot_msg and ('тільки для' in bot_msg or 'только для' in bot_msg or 'only for' in bot_msg):
+        if 'photo' in bot_matched and 'only_for' in bot_matched:
             return {
                 'ru': 'Нужно отправить мне 2-3 своих фото. После этого я отправлю их на рассмотрение офису 😊',
                 'uk': 'Потрібно надіслати мені 2-3 свої фото. Після цього я відправлю їх на розгляд офісу 😊',
                 'en': 'You need to send me 2-3 photos of yourself. After that I will send them for office review 😊'
             }.get(user_lang, 'Нужно отправить мне 2-3 своих фото. После этого я отправлю их на рассмотрение офису 😊')
         
-        if any(kw in bot_msg for kw in instructions_keywords):
-            if 'скрин' in bot_msg or 'screenshot' in bot_msg or 'офіс' in bot_msg or 'офис' in bot_msg:
+        if 'instructions' in bot_matched:
+            if 'screenshot_or_office' in bot_matched:
                 return {
                     'ru': 'Просто жди активации от офиса. Обычно это происходит на следующий будний день. Как только активируют — сможешь начать работать! 😊',
                     'uk': 'Просто чекай активації від офісу. Зазвичай це відбувається наступного робочого дня. Як тільки активують — зможеш почати працювати! 😊',
@@ -1473,16 +1557,45 @@ async def is_contextual_question(question, history):
     
     return None
 
-async def get_ai_response_with_retry(user_id, question, max_retries=3, is_in_groups=False):
+# История для промпта; контекстная проверка смотрит последние 10
+REQUEST_HISTORY_LIMIT = 15
+CONTEXTUAL_HISTORY_LIMIT = 10
+
+class AIRequestContext:
+    """Всё, что нужно для ответа на один вопрос. Собирается один раз в хендлере
+    и переиспользуется всеми этапами и повторными попытками.
+    """
+
+    def __init__(self, user_id, question, user, is_in_groups, history):
+        self.user_id = user_id
+        self.question = question
+        self.user = user
+        self.is_in_groups = is_in_groups
+        self.history = history
+        self.lang = user['language'] if user and user['language'] else 'ru'
+        self.category = get_status_category(user['status'] if user else None)
+        self.normalized_question = normalize_question(question)
+        self.intents = INTENT_MATCHER.match_groups(question.lower())
+        # Общий срок на все попытки ответа
+        self.deadline = asyncio.get_running_loop().time() + AI_REQUEST_DEADLINE
+
+async def build_request_context(user_id, question, is_in_groups=False):
+    user = await get_user(user_id)
+    history = await get_messages(user_id, limit=REQUEST_HISTORY_LIMIT)
+    return AIRequestContext(user_id, question, user, is_in_groups, history)
+
+async def get_ai_response_with_retry(user_id, question, max_retries=3, is_in_groups=False, on_partial=None, context=None):
     logger.info(f"Starting AI request for user {user_id}")
     
-    user = await get_user(user_id)
-    user_lang = user['language'] if user and user['language'] else 'ru'
+    if context is None:
+        context = await build_request_context(user_id, question, is_in_groups)
+    
+    user_lang = context.lang
     
     # 🔴 ПРОВЕРКА - блокируем рабочие вопросы для не-членов групп
     # КРОМЕ вопросов о заработках!
     if not is_in_groups:
-        q_lower = question.lower()
+        matched = context.intents
         
         # Список категорий, которые БЛОКИРУЮТСЯ для не-членов
         # earnings НЕТ в этом списке - вопросы о заработке доступны всем!
@@ -1498,12 +1611,10 @@ async def get_ai_response_with_retry(user_id, question, max_retries=3, is_in_gro
         matched_work_category = None
         
         for category in work_categories:
-            if category in KNOWLEDGE_KEYWORDS:
-                keywords = KNOWLEDGE_KEYWORDS[category]
-                if any(keyword in q_lower for keyword in keywords):
-                    is_work_question = True
-                    matched_work_category = category
-                    break
+            if f'knowledge:{category}' in matched:
+                is_work_question = True
+                matched_work_category = category
+                break
         
         if is_work_question:
             logger.warning(f"Work question from non-member detected: {matched_work_category}")
@@ -1533,8 +1644,8 @@ async def get_ai_response_with_retry(user_id, question, max_retries=3, is_in_gro
             'escalate': False
         }
     
-    history = await get_messages(user_id, limit=10)
-    contextual_answer = await is_contextual_question(question, history)
+    history = context.history[-CONTEXTUAL_HISTORY_LIMIT:]
+    contextual_answer = await is_contextual_question(question, history, context.user)
     if contextual_answer:
         logger.info(f"Contextual question detected for user {user_id}")
         return {
@@ -1543,10 +1654,22 @@ async def get_ai_response_with_retry(user_id, question, max_retries=3, is_in_gro
             'escalate': False
         }
     
-    for attempt in range(max_retries):
+    indexed_answer = await find_indexed_answer(question, user_lang, is_in_groups)
+    if indexed_answer:
+        answer, similarity = indexed_answer
+        logger.info(f"Answer index match for user {user_id}")
+        return {
+            'answer': answer,
+            'confidence': int(similarity * 100),
+            'escalate': False
+        }
+    
+    attempt = 0
+    while True:
+        attempt += 1
         try:
-            logger.info(f"AI attempt {attempt + 1}/{max_retries} for user {user_id}")
-            response = await get_ai_response(user_id, question, is_in_groups)
+            logger.info(f"AI attempt {attempt}/{max_retries} for user {user_id}")
+            response = await get_ai_response(user_id, question, is_in_groups, on_partial, context)
             
             if response['escalate']:
                 logger.info(f"AI escalated for user {user_id}")
@@ -1556,42 +1679,133 @@ async def get_ai_response_with_retry(user_id, question, max_retries=3, is_in_gro
                 logger.info(f"AI response successful for user {user_id}")
                 return response
             
-            logger.warning(f"AI returned empty/invalid response for user {user_id}, attempt {attempt + 1}")
-            
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2)
-                
+            error_kind = 'invalid_reply'
+            logger.warning(f"AI returned empty/invalid response for user {user_id}, attempt {attempt}")
+        except AIReplyError as e:
+            error_kind = e.kind
+            logger.warning(f"AI {e.kind} for user {user_id}, attempt {attempt}: {e}")
         except asyncio.TimeoutError:
-            logger.error(f"AI timeout for user {user_id}, attempt {attempt + 1}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(3)
-            else:
-                return {
-                    'answer': '',
-                    'confidence': 0,
-                    'escalate': True
-                }
+            error_kind = 'timeout'
+            logger.error(f"AI timeout for user {user_id}, attempt {attempt}")
         except Exception as e:
-            logger.error(f"AI error for user {user_id}, attempt {attempt + 1}: {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(3)
-            else:
-                return {
-                    'answer': '',
-                    'confidence': 0,
-                    'escalate': True
-                }
+            error_kind = 'upstream'
+            logger.error(f"AI error for user {user_id}, attempt {attempt}: {e}")
+        
+        delay = get_retry_delay(attempt)
+        time_left = context.deadline - asyncio.get_running_loop().time()
+        if attempt >= min(max_retries, RETRY_LIMITS[error_kind]) or time_left < delay + AI_MIN_ATTEMPT_TIME:
+            break
+        
+        await asyncio.sleep(delay)
     
-    logger.warning(f"All AI attempts failed for user {user_id}, escalating")
+    logger.warning(f"AI attempts for user {user_id} ended with {error_kind} after {attempt}, escalating")
     return {
         'answer': '',
         'confidence': 0,
         'escalate': True
     }
 
-async def get_ai_response(user_id, question, is_in_groups=False):
-    user = await get_user(user_id)
-    user_lang = user['language'] if user and user['language'] else 'ru'
+# Сколько попыток даём каждому виду ошибки
+RETRY_LIMITS = {
+    'timeout': 2,
+    'g4f_error': 3,
+    'empty': 3,
+    'invalid_reply': 2,
+    'upstream': 3,
+}
+
+class AIReplyError(Exception):
+    def __init__(self, kind, message=''):
+        super().__init__(message or kind)
+        self.kind = kind
+
+# При всплеске ошибок сразу эскалируем
+ai_breaker = CircuitBreaker(
+    'ai', AI_BREAKER_WINDOW, AI_BREAKER_FAILURE_RATE, AI_BREAKER_MIN_CALLS, AI_BREAKER_COOLDOWN
+)
+
+def get_retry_delay(attempt):
+    # Экспоненциальная задержка со случайным разбросом
+    return random.uniform(0, min(AI_RETRY_MAX_DELAY, AI_RETRY_BASE_DELAY * 2 ** attempt))
+
+ANSWER_FIELD_PATTERN = re.compile(r'"answer"\s*:\s*"')
+JSON_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '/': '/'}
+
+def extract_partial_answer(buffer):
+    """Текст ответа из недописанного JSON (или просто текста) для показа по ходу генерации"""
+    text = buffer.lstrip()
+    if text.startswith('`'):
+        newline = text.find('\n')
+        if newline == -1:
+            return ''
+        text = text[newline + 1:].lstrip()
+    
+    if text.startswith('{'):
+        match = ANSWER_FIELD_PATTERN.search(text)
+        if not match:
+            return ''
+        
+        # JSON ещё не дописан, строку разбираем вручную
+        chars = []
+        i = match.end()
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                break
+            if char != '\\':
+                chars.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                break
+            escape = text[i + 1]
+            if escape == 'u':
+                if i + 6 > len(text):
+                    break
+                try:
+                    code = int(text[i + 2:i + 6], 16)
+                    if not 0xD800 <= code <= 0xDFFF:
+                        chars.append(chr(code))
+                except ValueError:
+                    pass
+                i += 6
+                continue
+            chars.append(JSON_ESCAPES.get(escape, escape))
+            i += 2
+        text = ''.join(chars)
+    elif text.startswith('['):
+        return ''
+    
+    text = text.replace('**', '').replace('__', '').replace('*', '').replace('_', '')
+    return text[:3800]
+
+async def _stream_ai_content(user_id, messages, category, deadline, on_partial):
+    parts = []
+    shown = ''
+    
+    async for chunk in llm.stream(
+        messages,
+        model="gpt-4",
+        timeout=AI_ATTEMPT_TIMEOUT,
+        deadline=deadline,
+        expect_json=True,
+        priority=priority_for_category(category),
+        max_wait=LLM_MAX_QUEUE_WAIT
+    ):
+        parts.append(chunk)
+        partial = extract_partial_answer(''.join(parts))
+        if partial and partial != shown and not is_g4f_error(partial):
+            shown = partial
+            await on_partial(partial)
+    
+    logger.info(f"AI stream finished for user {user_id}: {sum(len(part) for part in parts)} chars")
+    return ''.join(parts) or None
+
+async def get_ai_response(user_id, question, is_in_groups=False, on_partial=None, context=None):
+    if context is None:
+        context = await build_request_context(user_id, question, is_in_groups)
+    
+    user_lang = context.lang
     
     if not user_lang or user_lang not in ['ru', 'uk', 'en']:
         from utils.language_detector import detect_language
@@ -1607,42 +1821,62 @@ async def get_ai_response(user_id, question, is_in_groups=False):
             'escalate': False
         }
     
+    category = context.category
+    cache_key = None
+    if 'what_to_do' not in context.intents:
+        last_bot_message = next((msg['content'] for msg in reversed(context.history) if msg['role'] == 'bot'), None)
+        cache_key = make_cache_key(context.normalized_question, user_lang, category, is_in_groups, last_bot_message)
+    versions = cache_versions()
+    
+    cached_answer = get_cached_answer(cache_key)
+    if cached_answer:
+        logger.info(f"Answer cache hit for user {user_id}")
+        return cached_answer
+    
     logger.info(f"Building context for user {user_id}")
-    context_prompt = await build_context_prompt(user_id, question, is_in_groups)
+    context_prompt = await build_context_prompt(user_id, question, is_in_groups, context)
+    
+    if not ai_breaker.allow():
+        logger.warning(f"AI circuit open, escalating user {user_id} without calling AI")
+        return {
+            'answer': '',
+            'confidence': 0,
+            'escalate': True
+        }
     
     try:
         logger.info(f"Calling AI for user {user_id}")
         
-        response = await asyncio.wait_for(
-            asyncio.to_thread(
-                client.chat.completions.create,
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": context_prompt}
+        ]
+        
+        # Разбор и эскалация - только по полному ответу
+        if on_partial is not None and LLM_STREAMING:
+            content = await _stream_ai_content(user_id, messages, category, context.deadline, on_partial)
+        else:
+            content = await llm.complete(
+                messages,
                 model="gpt-4",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": context_prompt}
-                ]
-            ),
-            timeout=45.0
-        )
+                timeout=AI_ATTEMPT_TIMEOUT,
+                deadline=context.deadline,
+                expect_json=True,
+                priority=priority_for_category(category),
+                max_wait=LLM_MAX_QUEUE_WAIT
+            )
         
-        if not response or not hasattr(response, 'choices') or not response.choices:
-            logger.warning(f"Empty AI response for user {user_id}")
-            return {
-                'answer': '',
-                'confidence': 0,
-                'escalate': True
-            }
+        if content is None:
+            ai_breaker.record_failure()
+            raise AIReplyError('empty', "empty AI response")
         
-        content = response.choices[0].message.content
-        content = content.strip() if hasattr(content, 'strip') else str(content).strip()
+        content = content.strip()
         
         if is_g4f_error(content):
-            logger.warning(f"g4f error detected for user {user_id}: {content[:100]}")
-            return {
-                'answer': '',
-                'confidence': 0,
-                'escalate': True
-            }
+            ai_breaker.record_failure()
+            raise AIReplyError('g4f_error', content[:100])
+        
+        ai_breaker.record_success()
         
         if content.startswith('```json'):
             content = content[7:-3].strip()
@@ -1683,13 +1917,15 @@ async def get_ai_response(user_id, question, is_in_groups=False):
         if 'escalate' not in result:
             result['escalate'] = result['confidence'] < AI_CONFIDENCE_THRESHOLD
         
-        if is_g4f_error(str(result.get('answer', ''))):
-            logger.warning(f"g4f error in parsed answer for user {user_id}")
-            return {
-                'answer': '',
-                'confidence': 0,
-                'escalate': True
-            }
+        # При эскалации ответ может быть пустым
+        if result['escalate']:
+            logger.info(f"AI response for {user_id}: conf={result['confidence']}, esc=True")
+            return result
+        
+        answer_text = str(result.get('answer', ''))
+        if is_g4f_error(answer_text):
+            kind = 'invalid_reply' if len(answer_text.strip()) < 3 else 'g4f_error'
+            raise AIReplyError(kind, f"unusable answer in parsed reply: {answer_text[:100]}")
         
         if len(str(result.get('answer', ''))) > 4000:
             result['answer'] = str(result['answer'])[:3800] + "\n\n(продолжение в следующем сообщении...)"
@@ -1698,11 +1934,29 @@ async def get_ai_response(user_id, question, is_in_groups=False):
         
         logger.info(f"AI response for {user_id}: conf={result['confidence']}, esc={result['escalate']}")
         
+        store_cached_answer(cache_key, result, versions)
+        
         return result
         
+    except AdmissionTimeout:
+        # Очередь переполнена - сразу к менеджеру
+        ai_breaker.release()
+        logger.warning(f"LLM queue full for user {user_id}, escalating without AI")
+        return {
+            'answer': '',
+            'confidence': 0,
+            'escalate': True
+        }
+    except AIReplyError:
+        raise
+    except asyncio.CancelledError:
+        ai_breaker.release()
+        raise
     except asyncio.TimeoutError:
+        ai_breaker.record_failure()
         logger.error(f"AI timeout for {user_id}")
         raise
     except Exception as e:
+        ai_breaker.record_failure()
         logger.error(f"AI error for {user_id}: {e}")
         raise
\ No newline at end of file
@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+
+from config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_MIN_CONFIDENCE, ANSWER_CACHE_MIN_WORDS
+from database import data_version
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r'\w+')
+
+_cache = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'expired': 0, 'evicted': 0}
+
+def normalize_question(question):
+    """Регистр, пунктуация, эмодзи и лишние пробелы не меняют ключ"""
+    return ' '.join(WORD_PATTERN.findall((question or '').lower().replace('ё', 'е')))
+
+def cache_versions():
+    # Ответы строятся из FAQ, обучения и материалов
+    return (data_version('faq'), data_version('ai_learning'), data_version('materials'))
+
+def _fingerprint(text):
+    normalized = normalize_question(text)
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).hexdigest()
+
+def make_cache_key(normalized_question, user_lang, category, is_in_groups, last_bot_message=None):
+    # Ответ зависит от переписки, поэтому последний ответ бота входит в ключ
+    if not normalized_question or len(normalized_question.split()) < ANSWER_CACHE_MIN_WORDS:
+        return None
+    return (normalized_question, user_lang, category, bool(is_in_groups), _fingerprint(last_bot_message))
+
+def get_cached_answer(key):
+    if key is None:
+        return None
+
+    entry = _cache.get(key)
+    if entry is None:
+        _stats['misses'] += 1
+        return None
+
+    versions, expires_at, answer = entry
+    if versions != cache_versions() or expires_at < time.monotonic():
+        del _cache[key]
+        _stats['expired'] += 1
+        _stats['misses'] += 1
+        return None
+
+    _cache.move_to_end(key)
+    _stats['hits'] += 1
+    return dict(answer)
+
+def store_cached_answer(key, response, versions):
+    # versions взяты до запроса к LLM: изменения за время запроса сделают запись устаревшей
+    if key is None or response.get('escalate') or not response.get('answer'):
+        return
+    confidence = response.get('confidence')
+    if not isinstance(confidence, (int, float)) or confidence < ANSWER_CACHE_MIN_CONFIDENCE:
+        return
+
+    answer = {
+        'answer': response['answer'],
+        'confidence': confidence,
+        'escalate': False
+    }
+    _cache[key] = (versions, time.monotonic() + ANSWER_CACHE_TTL, answer)
+    _cache.move_to_end(key)
+    _stats['stores'] += 1
+
+    while len(_cache) > ANSWER_CACHE_SIZE:
+        _cache.popitem(last=False)
+        _stats['evicted'] += 1
+
+def clear_answer_cache():
+    _cache.clear()
+
+def get_answer_cache_stats():
+    lookups = _stats['hits'] + _stats['misses']
+    return {
+        **_stats,
+        'size': len(_cache),
+        'hit_rate': round(_stats['hits'] / lookups * 100) if lookups else 0
+    }
@@ -0,0 +1,222 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+import zlib
+
+from config import ANSWER_INDEX_BUCKETS, ANSWER_INDEX_THRESHOLD, ANSWER_INDEX_TOP_K, ANSWER_INDEX_MIN_MARGIN
+from database import get_faq, get_admin_ai_learning, data_version
+from utils.answer_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# N-граммы символов терпят опечатки и окончания
+NGRAM_SIZES = (3, 4)
+
+# Рабочие вопросы - только для участников групп, как и в промпте
+MEMBERS_ONLY_FAQ_CATEGORIES = ('working',)
+
+def _features(text):
+    """Хешированные n-граммы символов с сублинейным TF"""
+    normalized = normalize_question(text)
+    if not normalized:
+        return {}
+
+    padded = f' {normalized} '
+    counts = {}
+    for size in NGRAM_SIZES:
+        for i in range(len(padded) - size + 1):
+            # crc32, а не hash(): одинаков между перезапусками
+            bucket = zlib.crc32(padded[i:i + size].encode('utf-8')) % ANSWER_INDEX_BUCKETS
+            counts[bucket] = counts.get(bucket, 0) + 1
+    return {bucket: 1 + math.log(count) for bucket, count in counts.items()}
+
+class AnswerIndex:
+    """TF-IDF по вопросам FAQ и ответам админа с поиском ближайших по косинусу.
+
+    Документы добавляются и удаляются по одному; idf и нормы документов
+    пересчитываются лениво при следующем поиске.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.postings = {}
+        self._norms = {}
+        self._idf = {}
+        self._dirty = False
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, key, question, answer, lang=None, category=None, members_only=False):
+        self.remove(key)
+        features = _features(question)
+        if not features:
+            return
+
+        self.docs[key] = {
+            'question': question,
+            'answer': answer,
+            'lang': lang,
+            'category': category,
+            'members_only': members_only,
+            'features': features
+        }
+        for bucket, tf in features.items():
+            self.postings.setdefault(bucket, {})[key] = tf
+        self._dirty = True
+
+    def remove(self, key):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+
+        for bucket in doc['features']:
+            postings = self.postings[bucket]
+            del postings[key]
+            if not postings:
+                del self.postings[bucket]
+        self._dirty = True
+
+    def _refresh_weights(self):
+        doc_count = len(self.docs)
+        self._idf = {
+            bucket: math.log((1 + doc_count) / (1 + len(postings))) + 1
+            for bucket, postings in self.postings.items()
+        }
+        idf = self._idf
+        self._norms = {
+            key: math.sqrt(sum((tf * idf[bucket]) ** 2 for bucket, tf in doc['features'].items()))
+            for key, doc in self.docs.items()
+        }
+        self._dirty = False
+
+    def search(self, question, lang=None, is_in_groups=True, top_k=ANSWER_INDEX_TOP_K):
+        if not self.docs:
+            return []
+        if self._dirty:
+            self._refresh_weights()
+
+        idf = self._idf
+        features = _features(question)
+        query = {bucket: tf * idf[bucket] for bucket, tf in features.items() if bucket in idf}
+        if not query:
+            return []
+
+        # Незнакомые индексу n-граммы тоже входят в норму запроса
+        max_idf = math.log(1 + len(self.docs)) + 1
+        query_norm = math.sqrt(
+            sum(weight ** 2 for weight in query.values())
+            + sum((tf * max_idf) ** 2 for bucket, tf in features.items() if bucket not in idf)
+        )
+
+        scores = {}
+        for bucket, weight in query.items():
+            bucket_weight = weight * idf[bucket]
+            for key, tf in self.postings[bucket].items():
+                scores[key] = scores.get(key, 0) + bucket_weight * tf
+
+        docs = self.docs
+        norms = self._norms
+        results = (
+            (score / (query_norm * norms[key]), key)
+            for key, score in scores.items()
+            if (lang is None or docs[key]['lang'] in (None, lang))
+            and (is_in_groups or not docs[key]['members_only'])
+        )
+        return [(similarity, docs[key]) for similarity, key in heapq.nlargest(top_k, results)]
+
+def _add_faq(index, row):
+    index.add(
+        ('faq', row['id']), row['question'], row['answer'],
+        lang=row['language'] or 'ru',
+        category=row['category'],
+        members_only=row['category'] in MEMBERS_ONLY_FAQ_CATEGORIES
+    )
+
+def _add_admin_answer(index, row):
+    # Язык ответа админа не известен; отдаём их только участникам групп
+    index.add(('admin', row['id']), row['question'], row['answer'], members_only=True)
+
+def _build_index(faq_rows, learning_rows):
+    index = AnswerIndex()
+    for row in faq_rows:
+        _add_faq(index, row)
+    for row in learning_rows:
+        _add_admin_answer(index, row)
+    return index
+
+_index = None
+_faq_version = None
+_admin_version = None
+_last_admin_id = 0
+_lock = asyncio.Lock()
+
+async def refresh_answer_index():
+    """Подтягивает изменения FAQ и новые ответы админа, не перестраивая весь индекс"""
+    global _index, _faq_version, _admin_version, _last_admin_id
+
+    if _index is not None and _faq_version == data_version('faq') and _admin_version == data_version('ai_learning_admin'):
+        return _index
+
+    async with _lock:
+        if _index is None:
+            started = time.monotonic()
+            faq_version = data_version('faq')
+            admin_version = data_version('ai_learning_admin')
+            faq_rows = await get_faq()
+            learning_rows = await get_admin_ai_learning()
+
+            _index = await asyncio.to_thread(_build_index, faq_rows, learning_rows)
+            _faq_version = faq_version
+            _admin_version = admin_version
+            _last_admin_id = max((row['id'] for row in learning_rows), default=0)
+            logger.info(
+                f"Answer index built: {len(faq_rows)} FAQ, {len(learning_rows)} admin answers "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+            return _index
+
+        faq_version = data_version('faq')
+        if faq_version != _faq_version:
+            faq_rows = await get_faq()
+            current = {('faq', row['id']): row for row in faq_rows}
+            for key in [key for key in _index.docs if key[0] == 'faq' and key not in current]:
+                _index.remove(key)
+            for key, row in current.items():
+                doc = _index.docs.get(key)
+                if (doc is None or doc['question'] != row['question'] or doc['answer'] != row['answer']
+                        or doc['category'] != row['category']):
+                    _add_faq(_index, row)
+            _faq_version = faq_version
+
+        admin_version = data_version('ai_learning_admin')
+        if admin_version != _admin_version:
+            learning_rows = await get_admin_ai_learning(after_id=_last_admin_id)
+            for row in learning_rows:
+                _add_admin_answer(_index, row)
+                _last_admin_id = max(_last_admin_id, row['id'])
+            _admin_version = admin_version
+
+        return _index
+
+async def find_indexed_answer(question, user_lang='ru', is_in_groups=False):
+    """Готовый ответ, если вопрос почти совпадает с вопросом из FAQ или уже отвеченным админом"""
+    index = await refresh_answer_index()
+    matches = index.search(question, lang=user_lang, is_in_groups=is_in_groups)
+    if not matches:
+        return None
+
+    similarity, best = matches[0]
+    if similarity < ANSWER_INDEX_THRESHOLD:
+        return None
+
+    # Близкие соседи с разными ответами - вопрос неоднозначен
+    for other_similarity, other in matches[1:]:
+        if other['answer'] != best['answer'] and similarity - other_similarity < ANSWER_INDEX_MIN_MARGIN:
+            logger.info(f"Answer index: ambiguous match {best['question']!r} vs {other['question']!r}")
+            return None
+
+    logger.info(f"Answer index: matched {best['question']!r} with similarity {similarity:.2f}")
+    return best['answer'], similarity
@@ -1,8 +1,9 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
-import aiosqlite
-from config import DB_PATH
+from database import get_db, flush_writes
+from database.user_cache import invalidate_cached_user
+from database.queries import auto_hide_query
 
 logger = logging.getLogger(__name__)
 
@@ -22,29 +23,26 @@ async def auto_hide_inactive_users():
             registered_cutoff = now - timedelta(hours=REGISTERED_TIMEOUT_HOURS)
             registered_cutoff_str = registered_cutoff.strftime('%Y-%m-%d %H:%M:%S')
 
-            async with aiosqlite.connect(DB_PATH) as db:
-                placeholders_reg = ','.join(['?' for _ in REGISTRATION_STATUSES])
+            await flush_writes()
+
+            async with get_db() as db:
                 cursor = await db.execute(
-                    f'''UPDATE users SET hidden_at = ?
-                        WHERE hidden_at IS NULL
-                        AND status IN ({placeholders_reg})
-                        AND last_activity < ?''',
+                    auto_hide_query(len(REGISTRATION_STATUSES)),
                     (now.strftime('%Y-%m-%d %H:%M:%S'), *REGISTRATION_STATUSES, reg_cutoff_str)
                 )
                 reg_hidden = cursor.rowcount
 
-                placeholders_act = ','.join(['?' for _ in REGISTERED_STATUSES])
                 cursor = await db.execute(
-                    f'''UPDATE users SET hidden_at = ?
-                        WHERE hidden_at IS NULL
-                        AND status IN ({placeholders_act})
-                        AND last_activity < ?''',
+                    auto_hide_query(len(REGISTERED_STATUSES)),
                     (now.strftime('%Y-%m-%d %H:%M:%S'), *REGISTERED_STATUSES, registered_cutoff_str)
                 )
                 act_hidden = cursor.rowcount
 
                 await db.commit()
 
+                if reg_hidden or act_hidden:
+                    invalidate_cached_user()
+
                 if reg_hidden > 0:
                     logger.info(f"Auto-hide: {reg_hidden} registration users hidden (>{REGISTRATION_TIMEOUT_MINUTES}min inactive)")
                 if act_hidden > 0:
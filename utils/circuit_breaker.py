@@ -0,0 +1,83 @@
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Размыкается, когда доля ошибок в последних window вызовах достигает
+    failure_rate, и cooldown секунд сразу отказывает. Потом пропускает один
+    пробный вызов: успех замыкает цепь, ошибка размыкает её снова.
+    """
+
+    def __init__(self, name, window, failure_rate, min_calls, cooldown):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.probe_started = None
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def current_failure_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def allow(self):
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'open':
+            return False
+
+        # Проба без результата (отменённая) истекает через cooldown
+        now = time.monotonic()
+        if self.probe_started is not None and now - self.probe_started < self.cooldown:
+            return False
+        self.probe_started = now
+        return True
+
+    def release(self):
+        """Пропущенный вызов так и не дошёл до сервиса: результата нет, пробу можно повторить"""
+        self.probe_started = None
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit '{self.name}' closed after a successful probe")
+            self.opened_at = None
+            self.outcomes.clear()
+        self.probe_started = None
+        self.outcomes.append(True)
+
+    def record_failure(self):
+        self.probe_started = None
+        if self.opened_at is not None:
+            self.opened_at = time.monotonic()
+            return
+
+        self.outcomes.append(False)
+        if len(self.outcomes) >= self.min_calls and self.current_failure_rate() >= self.failure_rate:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            logger.warning(
+                f"Circuit '{self.name}' opened: {self.current_failure_rate():.0%} of the last "
+                f"{len(self.outcomes)} calls failed"
+            )
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'failure_rate': round(self.current_failure_rate() * 100),
+            'calls': len(self.outcomes),
+            'trips': self.trips,
+        }
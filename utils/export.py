@@ -0,0 +1,104 @@
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+
+from config import DB_PATH, DB_BUSY_TIMEOUT_MS, EXPORT_GZIP
+from database import flush_writes
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('txt', 'jsonl', 'csv')
+
+# Идёт по idx_messages_user_id, без сортировки
+EXPORT_QUERY = '''
+    SELECT u.user_id, u.username, u.status, m.role, m.content, m.timestamp
+    FROM messages m
+    JOIN users u ON u.user_id = m.user_id
+    ORDER BY m.user_id, m.id
+'''
+
+CSV_COLUMNS = ['user_id', 'username', 'status', 'role', 'content', 'timestamp']
+
+def _open_export_file(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+def _write_export(path, fmt, compress):
+    # Выполняется в отдельном потоке со своим read-only соединением
+    db = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    users_count = 0
+    messages_count = 0
+
+    try:
+        with _open_export_file(path, compress) as f:
+            writer = None
+            if fmt == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(CSV_COLUMNS)
+            elif fmt == 'txt':
+                f.write(f"Экспорт переписок - {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
+                f.write("=" * 80 + "\n\n")
+
+            current_user = None
+            for user_id, username, status, role, content, timestamp in db.execute(EXPORT_QUERY):
+                if user_id != current_user:
+                    current_user = user_id
+                    users_count += 1
+                    if fmt == 'txt':
+                        f.write(f"\n{'='*80}\n")
+                        f.write(f"Пользователь: @{username}\n")
+                        f.write(f"Статус: {status}\n")
+                        f.write(f"{'='*80}\n\n")
+
+                if fmt == 'csv':
+                    writer.writerow([user_id, username, status, role, content, timestamp])
+                elif fmt == 'jsonl':
+                    f.write(json.dumps({
+                        'user_id': user_id,
+                        'username': username,
+                        'status': status,
+                        'role': role,
+                        'content': content,
+                        'timestamp': timestamp
+                    }, ensure_ascii=False) + "\n")
+                else:
+                    role_emoji = "👤" if role == 'user' else "🔵"
+                    f.write(f"{role_emoji} {role} [{timestamp}]:\n{content}\n\n")
+
+                messages_count += 1
+    finally:
+        db.close()
+
+    return users_count, messages_count
+
+async def export_conversations(fmt='txt', compress=EXPORT_GZIP):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    # Отложенные записи должны попасть в БД до чтения
+    await flush_writes()
+
+    # У каждого экспорта свой файл
+    suffix = f'.{fmt}.gz' if compress else f'.{fmt}'
+    fd, path = tempfile.mkstemp(
+        prefix=f"conversations_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}_",
+        suffix=suffix
+    )
+    os.close(fd)
+
+    try:
+        users_count, messages_count = await asyncio.to_thread(_write_export, path, fmt, compress)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    logger.info(f"Exported {messages_count} messages from {users_count} users to {path}")
+    return path, users_count, messages_count
@@ -0,0 +1,86 @@
+import re
+from functools import lru_cache
+
+SCAN_CACHE_SIZE = 256
+
+def normalize_text(text):
+    return (text or '').lower().strip()
+
+def _trie_pattern(node):
+    terminal = '' in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+
+    if not branches:
+        return ''
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+
+    pattern = '(?:' + '|'.join(branches) + ')'
+    # Жадный "?" находит самое длинное слово с этой позиции
+    return pattern + '?' if terminal else pattern
+
+class KeywordMatcher:
+    """Один скомпилированный regex на все наборы ключевых слов.
+
+    Находит те же ключевые слова, что и проверки `keyword in text`, за один
+    проход по тексту: regex строится как префиксное дерево внутри lookahead,
+    поэтому совпадения ищутся на каждой позиции, включая перекрывающиеся.
+    """
+
+    def __init__(self, groups):
+        self.groups = {name: list(keywords) for name, keywords in groups.items()}
+
+        self._keyword_groups = {}
+        for name, keywords in self.groups.items():
+            for keyword in keywords:
+                self._keyword_groups.setdefault(keyword, set()).add(name)
+
+        keywords = list(self._keyword_groups)
+
+        # Длинное совпадение прячет вложенные слова ("диз" в "дизлайк")
+        self._contained = {
+            keyword: frozenset(other for other in keywords if other in keyword)
+            for keyword in keywords
+        }
+        self._contained_groups = {
+            keyword: frozenset(name for other in contained for name in self._keyword_groups[other])
+            for keyword, contained in self._contained.items()
+        }
+
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        self._pattern = re.compile(f'(?=({_trie_pattern(trie)}))') if keywords else None
+
+        self._scan = lru_cache(maxsize=SCAN_CACHE_SIZE)(self._scan_text)
+
+    def _scan_text(self, text):
+        if self._pattern is None:
+            return frozenset(), frozenset()
+
+        hits = {match.group(1) for match in self._pattern.finditer(text)}
+        if not hits:
+            return frozenset(), frozenset()
+
+        found = frozenset().union(*[self._contained[hit] for hit in hits])
+        matched_groups = frozenset().union(*[self._contained_groups[hit] for hit in hits])
+        return found, matched_groups
+
+    def find_keywords(self, text):
+        return self._scan(text)[0]
+
+    def match_groups(self, text):
+        return self._scan(text)[1]
+
+    def first_keyword(self, text, group):
+        """Первое по порядку в наборе ключевое слово, найденное в тексте"""
+        if group not in self._scan(text)[1]:
+            return None
+        found = self._scan(text)[0]
+        for keyword in self.groups[group]:
+            if keyword in found:
+                return keyword
+        return None
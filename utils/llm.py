@@ -0,0 +1,535 @@
+import asyncio
+import inspect
+import json
+import logging
+import time
+
+from config import (
+    LLM_BACKEND, LLM_API_BASE, LLM_API_KEY, LLM_MODEL, LLM_HTTP_POOL_SIZE,
+    LLM_PROVIDER_ATTEMPTS, LLM_PROVIDER_TIMEOUT, LLM_HEDGING, LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_BUDGET
+)
+from utils.admission import admission, PRIORITY_BACKGROUND
+from utils.provider_scoreboard import ProviderScoreboard
+
+logger = logging.getLogger(__name__)
+
+class LLMError(Exception):
+    pass
+
+def is_g4f_error(content):
+    if not content:
+        return True
+    c = content.lower()
+    if 'does not exist' in c:
+        return True
+    if 'the model does not' in c:
+        return True
+    if 'model' in c and 'exist' in c:
+        return True
+    if c.startswith('error'):
+        return True
+    if 'api.airforce' in c:
+        return True
+    if 'bad request' in c:
+        return True
+    if len(content.strip()) < 3:
+        return True
+    return False
+
+def is_json_reply(content):
+    content = content.strip()
+    if content.startswith('```'):
+        content = content.split('\n', 1)[-1].rsplit('```', 1)[0]
+    try:
+        return isinstance(json.loads(content), dict)
+    except ValueError:
+        return False
+
+def _chunk_content(chunk):
+    return chunk.choices[0].delta.content if getattr(chunk, 'choices', None) else None
+
+async def _close_stream(chunks):
+    """Закрывает брошенный поток провайдера, чтобы не висело соединение"""
+    aclose = getattr(chunks, 'aclose', None)
+    if aclose is None:
+        return
+    try:
+        await aclose()
+    except Exception as e:
+        logger.debug(f"Closing provider stream failed: {e}")
+
+class G4FBackend:
+    """g4f без RetryProvider: провайдеры перебираются по рейтингу из ProviderScoreboard"""
+    name = 'g4f'
+
+    def __init__(self):
+        from g4f.client import AsyncClient
+        import g4f
+
+        self.providers = {
+            provider.__name__: provider
+            for provider in g4f.Provider.__providers__ if provider.working
+        }
+        self.client = AsyncClient()
+        self.scoreboard = ProviderScoreboard(self.providers)
+        self.calls = 0
+        self.hedges = 0
+
+    async def _attempt(self, name, messages, model, expect_json, timeout=LLM_PROVIDER_TIMEOUT, background=False):
+        """Один запрос к одному провайдеру; результат сразу попадает в рейтинг"""
+        stats = self.scoreboard.get(name)
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    provider=self.providers[name]
+                ),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            # Таймаут фоновой задачи ничего не говорит о провайдере
+            if not background:
+                stats.record_failure('timeout', time.monotonic() - started)
+            raise LLMError(f"{name}: timeout")
+        except Exception as e:
+            stats.record_failure(e, time.monotonic() - started)
+            raise LLMError(f"{name}: {e}")
+
+        latency = time.monotonic() - started
+        content = response.choices[0].message.content if response and getattr(response, 'choices', None) else None
+        if content is None or is_g4f_error(str(content)):
+            stats.record_failure('empty or error reply', latency)
+            raise LLMError(f"{name}: empty or error reply")
+
+        content = str(content)
+        stats.record_success(latency, is_json_reply(content) if expect_json else None)
+        return content
+
+    @staticmethod
+    def _attempt_timeout(timeout, attempts):
+        # Время вызова делится между провайдерами, но не меньше LLM_PROVIDER_TIMEOUT
+        if timeout is None or not attempts:
+            return LLM_PROVIDER_TIMEOUT
+        return max(LLM_PROVIDER_TIMEOUT, timeout / attempts)
+
+    async def complete(self, messages, model, expect_json=False, timeout=None, background=False):
+        self.calls += 1
+        ranked = self.scoreboard.ranked()[:LLM_PROVIDER_ATTEMPTS]
+        attempt_timeout = self._attempt_timeout(timeout, len(ranked))
+
+        if LLM_HEDGING and expect_json and len(ranked) > 1:
+            return await self._complete_hedged(ranked, messages, model, attempt_timeout, background)
+
+        last_error = None
+        for name in ranked:
+            try:
+                return await self._attempt(name, messages, model, expect_json, attempt_timeout, background)
+            except LLMError as e:
+                last_error = e
+
+        raise LLMError(f"No provider answered: {last_error}")
+
+    async def _open_stream(self, name, messages, model, timeout=LLM_PROVIDER_TIMEOUT, background=False):
+        """Открывает поток у провайдера и ждёт первый непустой кусок"""
+        stats = self.scoreboard.get(name)
+        started = time.monotonic()
+        chunks = None
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                provider=self.providers[name],
+                stream=True
+            )
+            if inspect.isawaitable(response):
+                response = await asyncio.wait_for(response, timeout=timeout)
+            chunks = response.__aiter__()
+            while True:
+                left = timeout - (time.monotonic() - started)
+                content = _chunk_content(await asyncio.wait_for(chunks.__anext__(), timeout=max(left, 0)))
+                if content:
+                    return chunks, content, started
+        except StopAsyncIteration:
+            stats.record_failure('empty reply', time.monotonic() - started)
+            raise LLMError(f"{name}: empty reply")
+        except asyncio.TimeoutError:
+            if not background:
+                stats.record_failure('timeout', time.monotonic() - started)
+            await _close_stream(chunks)
+            raise LLMError(f"{name}: timeout")
+        except asyncio.CancelledError:
+            await _close_stream(chunks)
+            raise
+        except Exception as e:
+            stats.record_failure(e, time.monotonic() - started)
+            await _close_stream(chunks)
+            raise LLMError(f"{name}: {e}")
+
+    async def _first_chunk(self, ranked, messages, model, attempt_timeout, background, hedge):
+        """Первый кусок от лучшего провайдера. С hedge, если лидер молчит дольше
+        своего p90, поток параллельно открывается у следующего; проигравший
+        закрывается.
+        """
+        queue = list(ranked)
+        pending = {}
+        last_error = None
+        hedged = False
+        started = time.monotonic()
+
+        def launch():
+            name = queue.pop(0)
+            pending[asyncio.ensure_future(
+                self._open_stream(name, messages, model, attempt_timeout, background)
+            )] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if hedge and not hedged and queue and self.hedges < LLM_HEDGE_BUDGET * self.calls:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+
+                try:
+                    done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                except asyncio.CancelledError:
+                    # Срок вызывающего вышел, а провайдеры так ничего и не прислали
+                    for name in pending.values():
+                        self.scoreboard.get(name).record_failure('no reply before cancel', time.monotonic() - started)
+                    raise
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        chunks, content, opened = task.result()
+                    except LLMError as e:
+                        last_error = e
+                        continue
+                    if winner is None:
+                        winner = name, chunks, content, opened
+                    else:
+                        await _close_stream(chunks)
+
+                if winner is not None:
+                    if hedged:
+                        logger.info(f"Hedged LLM stream won by {winner[0]}")
+                    return winner
+
+                if not pending and queue:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise LLMError(f"No provider answered: {last_error}")
+
+    async def stream(self, messages, model, expect_json=False, timeout=None, background=False):
+        """Потоковый ответ лучшего провайдера. Пока ничего не отдано, при ошибке
+        или молчании дольше отведённого времени пробуем следующего; оборвавшийся
+        или зависший посреди ответа поток - ошибка вызова.
+        """
+        self.calls += 1
+        ranked = self.scoreboard.ranked()[:LLM_PROVIDER_ATTEMPTS]
+        attempt_timeout = self._attempt_timeout(timeout, len(ranked))
+        hedge = LLM_HEDGING and expect_json and len(ranked) > 1
+
+        name, chunks, content, started = await self._first_chunk(
+            ranked, messages, model, attempt_timeout, background, hedge
+        )
+        stats = self.scoreboard.get(name)
+        parts = [content]
+        try:
+            yield content
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=LLM_PROVIDER_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                content = _chunk_content(chunk)
+                if content:
+                    parts.append(content)
+                    yield content
+        except asyncio.TimeoutError:
+            if not background:
+                stats.record_failure('timeout', time.monotonic() - started)
+            raise LLMError(f"{name}: stream stalled")
+        except Exception as e:
+            stats.record_failure(e, time.monotonic() - started)
+            raise LLMError(f"{name}: stream broken: {e}")
+        finally:
+            await _close_stream(chunks)
+
+        content = "".join(parts)
+        latency = time.monotonic() - started
+        if is_g4f_error(content):
+            stats.record_failure('empty or error reply', latency)
+            raise LLMError(f"{name}: error reply")
+        stats.record_success(latency, is_json_reply(content) if expect_json else None)
+
+    def _hedge_delay(self, name):
+        delay = self.scoreboard.get(name).latency_percentile(LLM_HEDGE_PERCENTILE)
+        return max(delay if delay is not None else LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY)
+
+    async def _complete_hedged(self, ranked, messages, model, attempt_timeout=LLM_PROVIDER_TIMEOUT, background=False):
+        """Если первый провайдер не ответил за свой p90, параллельно спрашиваем
+        следующего и берём первый валидный JSON; проигравший запрос отменяется.
+        Дополнительных запросов не больше LLM_HEDGE_BUDGET от всех вызовов.
+        """
+        queue = list(ranked)
+        pending = {}
+        fallback = None
+        last_error = None
+        hedged = False
+
+        def launch():
+            name = queue.pop(0)
+            pending[asyncio.ensure_future(
+                self._attempt(name, messages, model, True, attempt_timeout, background)
+            )] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and queue and self.hedges < LLM_HEDGE_BUDGET * self.calls:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        content = task.result()
+                    except LLMError as e:
+                        last_error = e
+                        continue
+
+                    if is_json_reply(content):
+                        if hedged:
+                            logger.info(f"Hedged LLM request won by {name}")
+                        return content
+                    if fallback is None:
+                        fallback = content
+
+                # Ничего не ждём - пробуем следующего
+                if not pending and queue and fallback is None:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if fallback is not None:
+            return fallback
+        raise LLMError(f"No provider answered: {last_error}")
+
+    async def close(self):
+        pass
+
+class OpenAICompatibleBackend:
+    """Любой /chat/completions в формате OpenAI: один пул keep-alive соединений на процесс"""
+    name = 'openai'
+
+    def __init__(self, api_base=LLM_API_BASE, api_key=LLM_API_KEY, model=LLM_MODEL):
+        self.url = api_base.rstrip('/') + '/chat/completions'
+        self.api_key = api_key
+        self.model = model
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            headers = {'Content-Type': 'application/json'}
+            if self.api_key:
+                headers['Authorization'] = f'Bearer {self.api_key}'
+            self._session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit=LLM_HTTP_POOL_SIZE, keepalive_timeout=60)
+            )
+        return self._session
+
+    async def complete(self, messages, model, expect_json=False, timeout=None, background=False):
+        payload = {'model': self.model or model or 'gpt-4', 'messages': messages}
+        async with self._get_session().post(self.url, data=json.dumps(payload)) as response:
+            if response.status >= 400:
+                body = await response.text()
+                raise LLMError(f"HTTP {response.status}: {body[:200]}")
+            data = await response.json(content_type=None)
+
+        choices = data.get('choices') if isinstance(data, dict) else None
+        if not choices:
+            return None
+        return choices[0].get('message', {}).get('content')
+
+    async def stream(self, messages, model, expect_json=False, timeout=None, background=False):
+        payload = {'model': self.model or model or 'gpt-4', 'messages': messages, 'stream': True}
+        async with self._get_session().post(self.url, data=json.dumps(payload)) as response:
+            if response.status >= 400:
+                body = await response.text()
+                raise LLMError(f"HTTP {response.status}: {body[:200]}")
+
+            # SSE: по строке "data: {...}" на кусок
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8', 'ignore').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                choices = chunk.get('choices') or []
+                content = choices[0].get('delta', {}).get('content') if choices else None
+                if content:
+                    yield content
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+class MockBackend:
+    """Локальный бэкенд без сети: отвечает responder(messages, model) или заготовленным JSON"""
+    name = 'mock'
+
+    def __init__(self, responder=None, delay=0, chunk_size=16):
+        self.responder = responder
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.calls = []
+
+    async def complete(self, messages, model, expect_json=False, timeout=None, background=False):
+        self.calls.append((messages, model))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.responder is not None:
+            return self.responder(messages, model)
+        return json.dumps({'answer': 'Тестовый ответ', 'confidence': 90, 'escalate': False}, ensure_ascii=False)
+
+    async def stream(self, messages, model, expect_json=False, timeout=None, background=False):
+        content = await self.complete(messages, model, expect_json)
+        for start in range(0, len(content or ''), self.chunk_size):
+            yield content[start:start + self.chunk_size]
+
+    async def close(self):
+        pass
+
+BACKENDS = {
+    'g4f': G4FBackend,
+    'openai': OpenAICompatibleBackend,
+    'mock': MockBackend,
+}
+
+_backend = None
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        backend_class = BACKENDS.get(LLM_BACKEND)
+        if backend_class is None:
+            raise LLMError(f"Unknown LLM backend: {LLM_BACKEND}")
+        _backend = backend_class()
+        logger.info(f"LLM backend: {_backend.name}")
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+def get_provider_stats():
+    """Таблица провайдеров для админа; пустая, если бэкенд не перебирает провайдеров"""
+    scoreboard = getattr(get_backend(), 'scoreboard', None)
+    return scoreboard.snapshot() if scoreboard else []
+
+async def close_llm():
+    if _backend is not None:
+        await _backend.close()
+
+def remaining_time(deadline):
+    return deadline - asyncio.get_running_loop().time()
+
+async def complete(messages, model='', timeout=None, deadline=None, expect_json=False,
+                   priority=PRIORITY_BACKGROUND, max_wait=None):
+    """Один запрос к LLM; возвращает текст ответа или None, если ответ пустой.
+
+    timeout - секунды на этот вызов, deadline - момент loop.time(), после
+    которого ждать уже бессмысленно; действует более ранний. По истечении
+    бросает asyncio.TimeoutError, а отмена вызывающей задачи сразу
+    прерывает запрос без занятого потока. expect_json помечает запросы,
+    ответ на которые должен быть JSON - это учитывается в рейтинге провайдеров.
+
+    Запрос сначала проходит через общую очередь с приоритетом priority; если
+    место не освободилось за max_wait секунд, бросает AdmissionTimeout.
+    """
+    if deadline is not None:
+        left = remaining_time(deadline)
+        if left <= 0:
+            raise asyncio.TimeoutError()
+        max_wait = left if max_wait is None else min(max_wait, left)
+
+    async with admission.slot(priority, max_wait):
+        if deadline is not None:
+            left = remaining_time(deadline)
+            if left <= 0:
+                raise asyncio.TimeoutError()
+            timeout = left if timeout is None else min(timeout, left)
+
+        backend = get_backend()
+        content = await asyncio.wait_for(
+            backend.complete(messages, model, expect_json, timeout=timeout, background=priority == PRIORITY_BACKGROUND),
+            timeout=timeout
+        )
+
+    if content is None:
+        return None
+    return content if isinstance(content, str) else str(content)
+
+async def stream(messages, model='', timeout=None, deadline=None, expect_json=False,
+                 priority=PRIORITY_BACKGROUND, max_wait=None):
+    """То же, что complete, но отдаёт ответ кусками по мере генерации.
+
+    timeout ограничивает весь поток целиком, слот в очереди занят до его конца.
+    """
+    loop = asyncio.get_running_loop()
+    if deadline is not None:
+        left = remaining_time(deadline)
+        if left <= 0:
+            raise asyncio.TimeoutError()
+        max_wait = left if max_wait is None else min(max_wait, left)
+
+    async with admission.slot(priority, max_wait):
+        if timeout is not None:
+            call_deadline = loop.time() + timeout
+            deadline = call_deadline if deadline is None else min(deadline, call_deadline)
+
+        chunks = get_backend().stream(
+            messages, model, expect_json,
+            timeout=remaining_time(deadline) if deadline is not None else None,
+            background=priority == PRIORITY_BACKGROUND
+        )
+        try:
+            while True:
+                left = remaining_time(deadline) if deadline is not None else None
+                if left is not None and left <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=left)
+                except StopAsyncIteration:
+                    break
+                yield chunk if isinstance(chunk, str) else str(chunk)
+        finally:
+            await chunks.aclose()
@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import logging
+import math
+import re
+import time
+
+from database import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+INDEX_LANGUAGES = ('ru', 'uk', 'en')
+DEFAULT_LANGUAGE = 'ru'
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Грубый стемминг: слова обрезаются до префикса, чтобы "эфир" находил "эфиры"
+STEM_LENGTH = 6
+MIN_TOKEN_LENGTH = 3
+STEM_ENDINGS = 'аеёиоуыэюяьйіїєaeiouy'
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+_indexes = {}
+
+def _stem(token):
+    token = token[:STEM_LENGTH]
+    stem = token.rstrip(STEM_ENDINGS)
+    return stem if len(stem) >= MIN_TOKEN_LENGTH else token
+
+def tokenize(text):
+    """Общая токенизация для материалов и вопроса"""
+    if not text:
+        return []
+    return [
+        _stem(token)
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) >= MIN_TOKEN_LENGTH and not token.isdigit()
+    ]
+
+class MaterialsIndex:
+    def __init__(self, materials):
+        self.docs = []
+        self.doc_lengths = []
+        self.postings = {}
+
+        for material in materials:
+            content = material.get('text') or material.get('transcription', '')
+            if not content:
+                continue
+
+            doc_id = len(self.docs)
+            self.docs.append((material, content))
+
+            tokens = tokenize(content)
+            self.doc_lengths.append(len(tokens))
+
+            term_counts = {}
+            for token in tokens:
+                term_counts[token] = term_counts.get(token, 0) + 1
+            for term, tf in term_counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+
+        total_length = sum(self.doc_lengths)
+        avg_length = total_length / len(self.docs) if self.docs else 0
+        self.doc_norms = [
+            BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length) if avg_length else BM25_K1
+            for length in self.doc_lengths
+        ]
+
+        doc_count = len(self.docs)
+        self.idf = {
+            term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, question, max_results=3):
+        if not self.docs:
+            return []
+
+        scores = {}
+        doc_norms = self.doc_norms
+        for term in set(tokenize(question)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            weight = self.idf[term] * (BM25_K1 + 1)
+            for doc_id, tf in postings:
+                scores[doc_id] = scores.get(doc_id, 0) + weight * tf / (tf + doc_norms[doc_id])
+
+        # При равенстве - порядок из БД, новые первыми
+        best = heapq.nsmallest(max_results, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.docs[doc_id] for doc_id, _ in best]
+
+def _build_indexes(materials_by_key):
+    return {key: MaterialsIndex(materials) for key, materials in materials_by_key.items()}
+
+async def rebuild_materials_index():
+    from database.analysis import get_all_analysis_texts, get_all_analysis_audios, get_all_analysis_videos
+
+    global _indexes
+    started = time.monotonic()
+
+    materials_by_key = {}
+    for lang in INDEX_LANGUAGES:
+        materials_by_key[(lang, 'text')] = await get_all_analysis_texts(lang=lang)
+        materials_by_key[(lang, 'audio')] = await get_all_analysis_audios(lang=lang)
+        materials_by_key[(lang, 'video')] = await get_all_analysis_videos(lang=lang)
+
+    _indexes = await asyncio.to_thread(_build_indexes, materials_by_key)
+    bump_data_version('materials')
+
+    docs = sum(len(index.docs) for (lang, _), index in _indexes.items() if lang == DEFAULT_LANGUAGE)
+    logger.info(f"Materials index built: {docs} materials per language in {time.monotonic() - started:.2f}s")
+
+def clear_materials_index():
+    global _indexes
+    _indexes = {}
+    bump_data_version('materials')
+
+def search_materials(lang, kind, question, max_results=3):
+    """Находит наиболее релевантные материалы по вопросу"""
+    if lang not in INDEX_LANGUAGES:
+        lang = DEFAULT_LANGUAGE
+
+    index = _indexes.get((lang, kind))
+    if index is None:
+        return []
+    return index.search(question, max_results)
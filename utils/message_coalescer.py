@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+import logging
+import re
+
+from config import MESSAGE_COALESCE_WINDOW
+
+logger = logging.getLogger(__name__)
+
+class _Burst:
+    def __init__(self):
+        self.parts = []
+        self.version = 0
+        self.ai_task = None
+
+_bursts = {}
+# Токены уникальны между пачками: старый токен не совпадёт с новой пачкой
+_tokens = itertools.count(1)
+
+# Приветствие без вопроса в начале пачки иначе перехватит прямой ответ на
+# "привет", и сам вопрос останется без ответа
+GREETING_WORDS = {
+    'привет', 'приветик', 'приветствую', 'здравствуй', 'здравствуйте', 'добрый', 'доброе', 'доброго',
+    'день', 'вечер', 'утро', 'дня', 'вечера', 'утра', 'привіт', 'вітаю', 'добрий', 'вечір', 'ранок',
+    'ранку', 'hi', 'hello', 'hey', 'good', 'morning', 'evening', 'afternoon'
+}
+
+def is_greeting_only(text):
+    words = re.findall(r'\w+', (text or '').lower())
+    return bool(words) and all(word in GREETING_WORDS for word in words)
+
+def merge_parts(parts):
+    """Склеивает пачку в один вопрос, выбрасывая сообщения из одних приветствий"""
+    questions = [part for part in parts if not is_greeting_only(part)]
+    return "\n".join(questions or parts)
+
+async def collect_message(user_id, text):
+    """Копит сообщения пользователя, пока он пишет.
+
+    Возвращает (вопрос из всех неотвеченных сообщений, токен) последнему
+    сообщению пачки и (None, None) всем, кого перекрыло более новое. Новое
+    сообщение отменяет уже идущий запрос к ИИ - его текст войдёт в новый вопрос.
+    """
+    burst = _bursts.setdefault(user_id, _Burst())
+    burst.parts.append(text)
+    burst.version = version = next(_tokens)
+
+    if burst.ai_task is not None and not burst.ai_task.done():
+        logger.info(f"Cancelling superseded AI request for user {user_id}")
+        burst.ai_task.cancel()
+
+    await asyncio.sleep(MESSAGE_COALESCE_WINDOW)
+
+    if burst.version != version:
+        return None, None
+    if len(burst.parts) > 1:
+        logger.info(f"Coalesced {len(burst.parts)} messages from user {user_id}")
+    return merge_parts(burst.parts), version
+
+def discard_burst(user_id, token):
+    """Забывает пачку, если обработка оборвалась до ответа"""
+    burst = _bursts.get(user_id)
+    if burst is not None and burst.version == token:
+        _bursts.pop(user_id, None)
+
+async def run_coalesced(user_id, token, coro):
+    """Выполняет запрос к ИИ для пачки; None, если пока он шёл, пришло новое сообщение"""
+    burst = _bursts.get(user_id)
+    if burst is None or burst.version != token:
+        coro.close()
+        return None
+
+    task = asyncio.ensure_future(coro)
+    burst.ai_task = task
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if burst.version != token:
+            return None
+        _bursts.pop(user_id, None)
+        raise
+    except Exception:
+        if burst.version == token:
+            _bursts.pop(user_id, None)
+        raise
+    finally:
+        if burst.ai_task is task:
+            burst.ai_task = None
+
+    if burst.version != token:
+        return None
+
+    # Ответ дан, следующее сообщение начнёт новую пачку
+    _bursts.pop(user_id, None)
+    return result
@@ -0,0 +1,63 @@
+import logging
+import time
+
+from config import STREAM_EDIT_INTERVAL, STREAM_MIN_CHARS
+
+logger = logging.getLogger(__name__)
+
+STREAM_CURSOR = " ▌"
+
+class ProgressiveReply:
+    """Ответ, который дописывается по мере генерации.
+
+    Первый кусок отправляется сообщением, дальше оно редактируется не чаще
+    раза в STREAM_EDIT_INTERVAL секунд (лимиты Telegram на правки в чате).
+    """
+
+    def __init__(self, message):
+        self.message = message
+        self.sent = None
+        self.text = ''
+        self._last_edit = 0.0
+
+    async def update(self, text):
+        text = text.strip()
+        if len(text) < STREAM_MIN_CHARS or text == self.text:
+            return
+
+        now = time.monotonic()
+        if now - self._last_edit < STREAM_EDIT_INTERVAL:
+            return
+        self._last_edit = now
+
+        try:
+            if self.sent is None:
+                self.sent = await self.message.answer(text + STREAM_CURSOR)
+            else:
+                await self.sent.edit_text(text + STREAM_CURSOR)
+            self.text = text
+        except Exception as e:
+            logger.debug(f"Progressive reply update skipped: {e}")
+
+    async def finish(self, text):
+        if self.sent is None:
+            await self.message.answer(text)
+            return
+
+        try:
+            await self.sent.edit_text(text)
+        except Exception as e:
+            logger.warning(f"Final edit failed, sending answer as a new message: {e}")
+            await self.discard()
+            await self.message.answer(text)
+
+    async def discard(self):
+        """Убирает недописанный ответ, если в итоге вопрос уходит менеджеру"""
+        if self.sent is None:
+            return
+        try:
+            await self.sent.delete()
+        except Exception as e:
+            logger.debug(f"Progressive reply delete failed: {e}")
+        self.sent = None
+        self.text = ''
@@ -0,0 +1,70 @@
+import logging
+
+from config import PROMPT_CHARS_PER_TOKEN, PROMPT_MIN_TRUNCATED_CHARS
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(text):
+    """Грубая оценка без токенизатора: для смеси кириллицы и латиницы хватает"""
+    return -(-len(text) // PROMPT_CHARS_PER_TOKEN)
+
+class PromptBudget:
+    """Делит бюджет токенов между секциями промпта в порядке их важности.
+
+    Обязательные части (шаблон, вопрос) учитываются через take, остальные
+    секции через fit: берутся целые элементы, пока они помещаются, а первый
+    не поместившийся обрезается, если от него остаётся хоть что-то полезное.
+    """
+
+    def __init__(self, total_tokens):
+        self.total = total_tokens
+        self.remaining = total_tokens
+        self.sizes = {}
+        self.trimmed = set()
+
+    def take(self, name, text):
+        tokens = estimate_tokens(text)
+        self.remaining -= tokens
+        self.sizes[name] = self.sizes.get(name, 0) + tokens
+        return text
+
+    def fit(self, name, items, separator='\n', overhead='', keep_last=False):
+        """Возвращает элементы, которые влезли; keep_last сохраняет хвост (свежие сообщения)"""
+        self.sizes.setdefault(name, 0)
+        if not items:
+            return []
+
+        room = self.remaining * PROMPT_CHARS_PER_TOKEN - len(overhead)
+        ordered = list(reversed(items)) if keep_last else list(items)
+
+        kept = []
+        used = 0
+        for item in ordered:
+            gap = len(separator) if kept else 0
+            if used + gap + len(item) <= room:
+                kept.append(item)
+                used += gap + len(item)
+                continue
+
+            self.trimmed.add(name)
+            left = room - used - gap
+            if left >= PROMPT_MIN_TRUNCATED_CHARS:
+                kept.append(item[-left:] if keep_last else item[:left])
+                used += gap + left
+            break
+
+        if keep_last:
+            kept.reverse()
+        if kept:
+            tokens = estimate_tokens(overhead) + -(-used // PROMPT_CHARS_PER_TOKEN)
+            self.remaining -= tokens
+            self.sizes[name] += tokens
+        return kept
+
+    def log_sizes(self, user_id):
+        used = self.total - self.remaining
+        sizes = ", ".join(
+            f"{name}={tokens}" + ("✂" if name in self.trimmed else "")
+            for name, tokens in self.sizes.items()
+        )
+        logger.info(f"Prompt for user {user_id}: ~{used}/{self.total} tokens ({sizes})")
@@ -0,0 +1,153 @@
+import random
+import time
+from collections import deque
+
+from config import (
+    PROVIDER_LATENCY_WINDOW, PROVIDER_STATS_DECAY, PROVIDER_EXPLORE_RATE,
+    PROVIDER_QUARANTINE_AFTER, PROVIDER_QUARANTINE_BASE, PROVIDER_QUARANTINE_MAX
+)
+
+# При таком p50 оценка провайдера падает вдвое
+LATENCY_SCALE = 10.0
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class ProviderStats:
+    def __init__(self, name):
+        self.name = name
+        # Счётчики затухают, свежие вызовы весят больше
+        self.successes = 0.0
+        self.failures = 0.0
+        self.json_valid = 0.0
+        self.json_checked = 0.0
+        self.latencies = deque(maxlen=PROVIDER_LATENCY_WINDOW)
+        self.calls = 0
+        self.consecutive_failures = 0
+        self.quarantine_level = 0
+        self.quarantined_until = 0.0
+        self.last_error = None
+
+    @property
+    def success_rate(self):
+        # Новый провайдер начинает с 50%
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    @property
+    def json_rate(self):
+        return (self.json_valid + 1) / (self.json_checked + 2)
+
+    def latency_percentile(self, fraction):
+        return percentile(self.latencies, fraction)
+
+    @property
+    def p50(self):
+        return percentile(self.latencies, 0.5)
+
+    @property
+    def p95(self):
+        return percentile(self.latencies, 0.95)
+
+    def is_quarantined(self, now=None):
+        return self.quarantined_until > (now if now is not None else time.monotonic())
+
+    def score(self):
+        p50 = self.p50 if self.p50 is not None else LATENCY_SCALE
+        return self.success_rate * self.json_rate / (1 + p50 / LATENCY_SCALE)
+
+    def _decay(self):
+        self.successes *= PROVIDER_STATS_DECAY
+        self.failures *= PROVIDER_STATS_DECAY
+        self.json_valid *= PROVIDER_STATS_DECAY
+        self.json_checked *= PROVIDER_STATS_DECAY
+
+    def record_success(self, latency, json_valid=None):
+        self._decay()
+        self.calls += 1
+        self.successes += 1
+        self.latencies.append(latency)
+        if json_valid is not None:
+            self.json_checked += 1
+            self.json_valid += 1 if json_valid else 0
+        self.consecutive_failures = 0
+        # Каждый успех снижает уровень карантина
+        self.quarantine_level = max(0, self.quarantine_level - 1)
+
+    def record_failure(self, error, latency=None):
+        self._decay()
+        self.calls += 1
+        self.failures += 1
+        if latency is not None:
+            self.latencies.append(latency)
+        self.last_error = str(error)[:100]
+        self.consecutive_failures += 1
+
+        if self.consecutive_failures >= PROVIDER_QUARANTINE_AFTER:
+            self.quarantine_level += 1
+            duration = min(PROVIDER_QUARANTINE_BASE * 2 ** (self.quarantine_level - 1), PROVIDER_QUARANTINE_MAX)
+            self.quarantined_until = time.monotonic() + duration
+            self.consecutive_failures = 0
+
+class ProviderScoreboard:
+    def __init__(self, names):
+        self.providers = {name: ProviderStats(name) for name in names}
+
+    def get(self, name):
+        stats = self.providers.get(name)
+        if stats is None:
+            stats = self.providers[name] = ProviderStats(name)
+        return stats
+
+    def ranked(self):
+        """Провайдеры от лучшего к худшему; на карантине - только если других нет"""
+        now = time.monotonic()
+        available = [stats for stats in self.providers.values() if not stats.is_quarantined(now)]
+        if not available:
+            # Все на карантине: первым тот, кто выйдет раньше
+            return [stats.name for stats in sorted(self.providers.values(), key=lambda s: s.quarantined_until)]
+
+        available.sort(key=lambda stats: stats.score(), reverse=True)
+        names = [stats.name for stats in available]
+
+        # Иногда первым идёт случайный провайдер, чтобы его статистика обновлялась
+        if len(names) > 1 and random.random() < PROVIDER_EXPLORE_RATE:
+            explored = names.pop(random.randrange(1, len(names)))
+            names.insert(0, explored)
+        return names
+
+    def snapshot(self):
+        now = time.monotonic()
+        rows = []
+        for stats in sorted(self.providers.values(), key=lambda s: s.score(), reverse=True):
+            rows.append({
+                'name': stats.name,
+                'calls': stats.calls,
+                'success_rate': round(stats.success_rate * 100),
+                'json_rate': round(stats.json_rate * 100),
+                'p50': stats.p50,
+                'p95': stats.p95,
+                'quarantine_left': max(0, round(stats.quarantined_until - now)),
+                'last_error': stats.last_error,
+            })
+        return rows
+
+def format_scoreboard(rows, limit=20):
+    if not rows:
+        return "Нет данных о провайдерах"
+
+    def seconds(value):
+        return f"{value:.1f}s" if value is not None else "—"
+
+    lines = []
+    for row in rows[:limit]:
+        line = (
+            f"{row['name']}: {row['calls']} выз., успех {row['success_rate']}%, "
+            f"JSON {row['json_rate']}%, p50 {seconds(row['p50'])}, p95 {seconds(row['p95'])}"
+        )
+        if row['quarantine_left']:
+            line += f", 🚫 карантин {row['quarantine_left']}s"
+        lines.append(line)
+    return "\n".join(lines)
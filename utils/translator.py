@@ -1,20 +1,10 @@
 # utils/translator.py
 import asyncio
 import logging
-from g4f.client import Client
-from g4f.Provider import RetryProvider
-import g4f
 
-logger = logging.getLogger(__name__)
-
-all_providers = [
-    provider for provider in g4f.Provider.__providers__
-    if provider.working
-]
+from utils import llm
 
-client = Client(
-    provider=RetryProvider(all_providers, shuffle=True)
-)
+logger = logging.getLogger(__name__)
 
 async def _translate_with_retry(text, target_lang, max_retries=3):
     if not text or len(text.strip()) < 3:
@@ -37,25 +27,22 @@ async def _translate_with_retry(text, target_lang, max_retries=3):
 
     for attempt in range(max_retries):
         try:
-            response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    client.chat.completions.create,
-                    model="",
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ]
-                ),
+            translated = await llm.complete(
+                [
+                    {"role": "user", "content": prompt}
+                ],
+                model="",
                 timeout=120.0
             )
 
-            if not response or not hasattr(response, 'choices') or not response.choices:
+            if translated is None:
                 if attempt < max_retries - 1:
                     await asyncio.sleep(2 * (attempt + 1))
                     continue
                 logger.warning(f"Translation failed for lang={target_lang} after {max_retries} attempts")
                 return None
 
-            translated = response.choices[0].message.content.strip()
+            translated = translated.strip()
 
             if translated.startswith('```'):
                 translated = translated.split('```')[1].strip()